@@ -1,31 +1,61 @@
 import io
+from contextlib import asynccontextmanager
 import unicodedata
 import pickle
 import pandas as pd
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from typing import List, Optional
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from fpdf import FPDF
 from groq import Groq
 import os
 import uvicorn
 import sys
+import time
 
 # Ensure project root is on sys.path for importing src.* reliably
 PROJECT_ROOT = os.path.abspath(os.path.dirname(__file__))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
-from src.mlproject.predict_pipelines import PredictPipeline
+from src.mlproject.logger import logging, configure_logging
+from src.mlproject.predict_pipelines import get_predict_pipeline
+from src.mlproject.process_stats import process_memory
+from src.mlproject.features import encode_profile
+from src.mlproject.what_if import sweep
+from src.mlproject.wire_formats import MAX_BODY_BYTES, UnsupportedFormat, score_batch
+from src.mlproject.pdf_report import ReportRenderer, report_key
+from src.mlproject.batch_jobs import JobRunner
+from src.mlproject.chat_memory import ConversationStore, ChatMemoryConfig
+from src.mlproject.llm_client import LLMClient, RateLimitExceeded
+from src.mlproject.fallbacks import render_fallback
 
 # Load environment variables
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# proxies in front of the app that append to X-Forwarded-For (Heroku's router: 1; 0: use the socket peer)
+TRUSTED_PROXY_DEPTH = int(os.getenv("TRUSTED_PROXY_DEPTH", "1"))
 
 client = Groq(api_key=GROQ_API_KEY)
+# coalesces identical in-flight prompts, rate limits per client / globally,
+# and in SLO mode answers every LLM endpoint within its latency budget
+llm = LLMClient(client)
 
 # --------------------- FastAPI Setup ---------------------
-app = FastAPI(title="🪀 Heart Disease Predictor & Diet Assistant")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # per-process: under gunicorn this runs in each worker after the fork
+    log_path = configure_logging()
+    logging.info(f"API worker {os.getpid()} started, logging to {log_path}")
+    # batch jobs left unfinished by a previous process
+    await run_in_threadpool(job_runner.recover)
+    yield
+
+
+app = FastAPI(title="🪀 Heart Disease Predictor & Diet Assistant", lifespan=lifespan)
 
 # --------------------- Request Schemas ---------------------
 class HealthProfile(BaseModel):
@@ -46,112 +76,398 @@ class HealthProfile(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     language: str = "English"
+    # returned by the first /chat call; send it back to continue the conversation
+    session_id: Optional[str] = None
+    # optional patient context kept with the session
+    profile: Optional[HealthProfile] = None
+    prediction: Optional[int] = None
+
+class ReportRequest(BaseModel):
+    profile: HealthProfile
+    language: str = "English"
+    # sections already generated in the UI; missing ones are generated here
+    diet_plan: Optional[str] = None
+    risk_report: Optional[str] = None
+    doctor_note: Optional[str] = None
+
+report_renderer = ReportRenderer()
+# batch scoring in its own niced process pool, never on the request threads
+job_runner = JobRunner()
+
+class FeatureRange(BaseModel):
+    feature: str   # one of trestbps, chol, thalach, oldpeak
+    start: float
+    stop: float
+    steps: int = 20
+
+class WhatIfRequest(BaseModel):
+    profile: HealthProfile
+    ranges: List[FeatureRange]   # one or two features
 
 # --------------------- Translator ---------------------
-def translate_text(text: str, target_language: str) -> str:
+def translation_messages(text: str, target_language: str) -> list:
+    return [
+        {"role": "system", "content": "You are a helpful translator."},
+        {"role": "user", "content": f"Translate this to {target_language}:\n{text}"}
+    ]
+
+
+def translate_text(text: str, target_language: str, budget: Optional[float] = None) -> str:
+    # with a budget (seconds left of the endpoint's SLO), untranslated text is the fallback
     if target_language == "English":
         return text
-    response = client.chat.completions.create(
-        model="openai/gpt-oss-120b",
-        messages=[
-            {"role": "system", "content": "You are a helpful translator."},
-            {"role": "user", "content": f"Translate this to {target_language}:\n{text}"}
-        ]
-    )
-    return response.choices[0].message.content.strip()
+    if budget is not None:
+        reply, _ = llm.complete_within("translate", translation_messages(text, target_language),
+                                       fallback=lambda: text, budget=budget)
+        return reply.strip()
+    reply = llm.complete(translation_messages(text, target_language))
+    return reply.strip()
+
+
+def client_id(http_request: Request) -> str:
+    # Each trusted proxy appends the address it received the request from, so
+    # the entry TRUSTED_PROXY_DEPTH from the end is the real client; anything
+    # before it was sent by the client and can be forged.
+    forwarded = http_request.headers.get("x-forwarded-for")
+    if forwarded and TRUSTED_PROXY_DEPTH > 0:
+        hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+        if len(hops) >= TRUSTED_PROXY_DEPTH:
+            return hops[-TRUSTED_PROXY_DEPTH]
+    return http_request.client.host if http_request.client else "unknown"
 
 # --------------------- Endpoints ---------------------
 
+@app.exception_handler(RateLimitExceeded)
+def rate_limit_exceeded(request: Request, exc: RateLimitExceeded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
+
 @app.get("/debug-info")
 def debug_info():
     import sys as _sys
-    import sklearn as _sk
-    return {"python": _sys.version, "sklearn": _sk.__version__}
+    from importlib.metadata import version
+    # the installed version, without importing sklearn into an ONNX-serving worker
+    return {
+        "python": _sys.version,
+        "sklearn": version("scikit-learn"),
+        "model_run_id": get_predict_pipeline().run_id,
+        "memory": process_memory(),
+    }
 
 @app.post("/predict")
 def predict(profile: HealthProfile):
     try:
-        model_input = {
-            "age": profile.age,
-            "sex": 1 if profile.sex == "Male" else 0,
-            "cp": ["Typical Angina", "Atypical Angina", "Non-anginal", "Asymptomatic"].index(profile.cp),
-            "trestbps": profile.trestbps,
-            "chol": profile.chol,
-            "fbs": 1 if profile.fbs == "Yes" else 0,
-            "restecg": ["Normal", "ST-T Abnormality", "Left Ventricular Hypertrophy"].index(profile.restecg),
-            "thalach": profile.thalach,
-            "exang": 1 if profile.exang == "Yes" else 0,
-            "oldpeak": profile.oldpeak,
-            "slope": ["Upsloping", "Flat", "Downsloping"].index(profile.slope),
-            "ca": profile.ca,
-            "thal": ["Normal", "Fixed Defect", "Reversible Defect"].index(profile.thal),
-        }
-        pipeline = PredictPipeline()
+        model_input = encode_profile(profile.model_dump())
+        pipeline = get_predict_pipeline()
         prediction = pipeline.predict(model_input)
         return {"prediction": int(prediction), "risk": "High" if prediction == 1 else "Low"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/predict/batch")
+async def predict_batch(http_request: Request):
+    """
+    Score many rows at once. The body is a column map (JSON or MessagePack)
+    or an Arrow IPC stream, chosen by Content-Type; the response format
+    follows Accept (default: the request's format) and is zstd / gzip
+    compressed per Accept-Encoding.
+    """
+    # read with a cap instead of buffering an arbitrarily large upload
+    body = bytearray()
+    async for chunk in http_request.stream():
+        body += chunk
+        if len(body) > MAX_BODY_BYTES:
+            raise HTTPException(status_code=413, detail=f"Body exceeds {MAX_BODY_BYTES} bytes")
+    body = bytes(body)
+    try:
+        payload, media_type, encoding, rows = await run_in_threadpool(
+            score_batch, get_predict_pipeline(), body, http_request.headers
+        )
+    except UnsupportedFormat as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    headers = {"Vary": "Accept, Accept-Encoding", "X-Rows": str(rows)}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(payload, media_type=media_type, headers=headers)
+
+
+@app.post("/what-if")
+def what_if(request: WhatIfRequest):
+    try:
+        base = encode_profile(request.profile.model_dump())
+        ranges = {r.feature: (r.start, r.stop, r.steps) for r in request.ranges}
+        return sweep(get_predict_pipeline(), base, ranges)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.post("/similar-patients")
+def similar_patients(profile: HealthProfile, k: int = 5):
+    index = _similarity_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="Similarity index not built; run the training pipeline.")
+    return {"similar_patients": index.query(encode_profile(profile.model_dump()), k=max(1, min(k, 50)))}
+
+
+def _similarity_index():
+    # imported on first use: the index module pulls in sklearn, which the
+    # ONNX serving backend otherwise never loads
+    from src.mlproject.components.similarity_index import get_similarity_index
+    return get_similarity_index()
+
+
+def similar_cases_text(profile: HealthProfile, k: int = 5) -> str:
+    index = _similarity_index()
+    if index is None:
+        return ""
+    lines = []
+    for case in index.query(encode_profile(profile.model_dump()), k=k):
+        f = case["features"]
+        lines.append(
+            f"- Age {f['age']:.0f}, BP {f['trestbps']:.0f}, Chol {f['chol']:.0f}, HR {f['thalach']:.0f}, "
+            f"ST Depression {f['oldpeak']:.1f}: {'had' if case['outcome'] else 'no'} heart disease"
+        )
+    return "\nMost similar historical patients:\n" + "\n".join(lines) + "\n"
+
+
+def profile_risk(profile: HealthProfile) -> Optional[float]:
+    try:
+        row = pd.DataFrame([encode_profile(profile.model_dump())])
+        return float(get_predict_pipeline().predict_risk(row)[0])
+    except Exception:
+        return None
+
+
+def slo_reply(endpoint: str, messages: list, profile: HealthProfile, http_request: Request,
+              language: str = "English", prediction: Optional[int] = None, **kwargs):
+    """
+    The endpoint's LLM answer (translated if asked) within its latency
+    budget, or the templated fallback for the patient's risk bucket and
+    profile band. Returns (text, fell_back).
+    """
+    start = time.monotonic()
+    budget = llm.slo.budget(endpoint)
+
+    def fallback():
+        risk = profile_risk(profile)
+        if prediction is not None and (risk is None or int(risk > 0.5) != prediction):
+            # stay consistent with the prediction the caller is showing
+            risk = float(prediction)
+        return render_fallback(endpoint, profile.model_dump(), risk)
+
+    reply, fell_back = llm.complete_within(
+        endpoint,
+        messages,
+        fallback=fallback,
+        client_id=client_id(http_request),
+        budget=budget,
+        **kwargs,
+    )
+    reply = reply.strip()
+    if not fell_back:
+        remaining = budget - (time.monotonic() - start) if llm.slo.enabled else None
+        reply = translate_text(reply, language, budget=remaining)
+    return reply, fell_back
+
+
+def with_fallback_flag(response: dict, fell_back: bool) -> dict:
+    if fell_back:
+        response["fallback"] = True
+    return response
+
+
+@app.get("/llm-metrics")
+def llm_metrics():
+    """Hedge / fallback rates and latencies per LLM endpoint (this worker process)."""
+    return llm.metrics()
+
+
 @app.post("/diet-plan")
-def generate_diet_plan(profile: HealthProfile):
+def generate_diet_plan(profile: HealthProfile, http_request: Request):
     prompt = f"""
 I’m a {profile.age}-year-old {profile.sex.lower()} with:
 BP: {profile.trestbps}, Cholesterol: {profile.chol}, Fasting Sugar: {profile.fbs}
 Max HR: {profile.thalach}, ST Depression: {profile.oldpeak}, Thalassemia: {profile.thal}
 Create a heart-healthy diet plan including nutrients, foods to eat/avoid, and sample meals.
 """
-    response = client.chat.completions.create(
-        model="openai/gpt-oss-120b",
-        messages=[{"role": "system", "content": "You are a certified medical dietitian."},
-                  {"role": "user", "content": prompt}],
+    reply, fell_back = slo_reply(
+        "diet-plan",
+        [{"role": "system", "content": "You are a certified medical dietitian."},
+         {"role": "user", "content": prompt}],
+        profile, http_request,
         max_tokens=800
     )
-    return {"diet_plan": response.choices[0].message.content}
+    return with_fallback_flag({"diet_plan": reply}, fell_back)
 
 
 @app.post("/risk-report")
-def risk_report(profile: HealthProfile, prediction: int, language: str = "English"):
+def risk_report(profile: HealthProfile, prediction: int, http_request: Request, language: str = "English", similar: bool = False):
     prompt = f"""
 You are a cardiologist. Explain why the patient was predicted {'high' if prediction else 'low'} risk.
 Age: {profile.age}, Sex: {profile.sex}, Chol: {profile.chol}, BP: {profile.trestbps}, 
 HR: {profile.thalach}, ST Depression: {profile.oldpeak}, Angina: {profile.exang}, Thal: {profile.thal}
 """
-    response = client.chat.completions.create(model="openai/gpt-oss-120b", messages=[{"role": "user", "content": prompt}])
-    return {"risk_report": translate_text(response.choices[0].message.content.strip(), language)}
+    if similar:
+        prompt += similar_cases_text(profile)
+    reply, fell_back = slo_reply("risk-report", [{"role": "user", "content": prompt}], profile, http_request, language, prediction)
+    return with_fallback_flag({"risk_report": reply}, fell_back)
 
 
 @app.post("/lifestyle")
-def lifestyle_advice(profile: HealthProfile, language: str = "English"):
+def lifestyle_advice(profile: HealthProfile, http_request: Request, language: str = "English"):
     prompt = f"""
 Give daily lifestyle advice on diet, exercise, stress, and sleep for a patient with:
 Age: {profile.age}, Sex: {profile.sex}, BP: {profile.trestbps}, Chol: {profile.chol}, HR: {profile.thalach}, ST Depression: {profile.oldpeak}
 """
-    response = client.chat.completions.create(model="openai/gpt-oss-120b", messages=[{"role": "user", "content": prompt}])
-    return {"lifestyle": translate_text(response.choices[0].message.content.strip(), language)}
+    reply, fell_back = slo_reply("lifestyle", [{"role": "user", "content": prompt}], profile, http_request, language)
+    return with_fallback_flag({"lifestyle": reply}, fell_back)
 
 
 @app.post("/doctor-note")
-def doctor_note(profile: HealthProfile, prediction: int, language: str = "English"):
+def doctor_note(profile: HealthProfile, prediction: int, http_request: Request, language: str = "English", similar: bool = False):
     prompt = f"""
 Draft a doctor's summary note from patient profile and risk status:
 Age: {profile.age}, Sex: {profile.sex}, Risk: {"High" if prediction else "Low"},
 BP: {profile.trestbps}, Chol: {profile.chol}, HR: {profile.thalach}, ST Depression: {profile.oldpeak},
 Angina: {profile.exang}, Thalassemia: {profile.thal}, Vessels: {profile.ca}
 """
-    response = client.chat.completions.create(model="openai/gpt-oss-120b", messages=[{"role": "user", "content": prompt}])
-    return {"doctor_note": translate_text(response.choices[0].message.content.strip(), language)}
+    if similar:
+        prompt += similar_cases_text(profile)
+    reply, fell_back = slo_reply("doctor-note", [{"role": "user", "content": prompt}], profile, http_request, language, prediction)
+    return with_fallback_flag({"doctor_note": reply}, fell_back)
+
+
+@app.post("/report.pdf")
+async def report_pdf(request: ReportRequest, http_request: Request):
+    profile = request.profile
+    key = report_key(profile.model_dump(), request.language, request.diet_plan, request.risk_report, request.doctor_note)
+
+    pdf = report_renderer.cached(key)
+    if pdf is None:
+        # LLM calls are blocking; bound how many reports hold request threads
+        async with report_renderer.gate:
+            prediction = (await run_in_threadpool(predict, profile))["prediction"]
+            generated = {
+                "diet_plan": request.diet_plan
+                or await run_in_threadpool(generate_diet_plan, profile, http_request),
+                "risk_report": request.risk_report
+                or await run_in_threadpool(risk_report, profile, prediction, http_request, request.language),
+                "doctor_note": request.doctor_note
+                or await run_in_threadpool(doctor_note, profile, prediction, http_request, request.language),
+            }
+            sections = {name: v if isinstance(v, str) else v[name] for name, v in generated.items()}
+            degraded = any(isinstance(v, dict) and v.get("fallback") for v in generated.values())
+        # a report with templated fallback sections is not cached, so the next request retries the LLM
+        pdf = await report_renderer.render(
+            key, {"profile": profile.model_dump(), "prediction": prediction, "sections": sections},
+            cache=not degraded,
+        )
+
+    return StreamingResponse(
+        io.BytesIO(pdf),
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'attachment; filename="heart-report-{key[:12]}.pdf"'},
+    )
+
+
+def job_view(job: dict) -> dict:
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "filename": job["filename"],
+        "rows_total": job["rows_total"],
+        "rows_done": job["rows_done"],
+        "progress": round(job["rows_done"] / job["rows_total"], 4) if job["rows_total"] else None,
+        "error": job["error"],
+        "result_url": f"/jobs/{job['id']}/result" if job["status"] == "succeeded" else None,
+    }
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(file: UploadFile = File(...)):
+    """Upload a CSV / Parquet of health profiles to score in the background."""
+    try:
+        job = await run_in_threadpool(job_runner.create_job, file.file, file.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return job_view(job)
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = job_runner.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job_view(job)
+
+
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id: str):
+    job = job_runner.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    if job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    # streamed from disk in chunks, never loaded into memory
+    return FileResponse(job["output_path"], media_type="text/csv", filename=f"scores-{job_id}.csv")
+
+
+def summarize_turns(summary: str, turns: list) -> Optional[str]:
+    # runs in the background after a reply; None (over budget or failed) keeps the trimmed summary
+    transcript = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+    reply, fell_back = llm.complete_within(
+        "chat-summary",
+        [
+            {"role": "system", "content": "Summarize this diet and heart health conversation in under 150 words. Keep facts about the patient, their goals and advice already given."},
+            {"role": "user", "content": f"Previous summary: {summary or 'none'}\n\nNew turns:\n{transcript}"}
+        ],
+        fallback=lambda: None,
+        max_tokens=250
+    )
+    return None if fell_back or reply is None else reply.strip()
+
+
+chat_store = ConversationStore(ChatMemoryConfig(), summarizer=summarize_turns)
 
 
 @app.post("/chat")
-def chatbot(request: ChatRequest):
-    messages = [
-        {"role": "system", "content": "You are Healthy(B), a multilingual diet and heart health expert."},
-        {"role": "user", "content": request.message}
-    ]
-    response = client.chat.completions.create(model="openai/gpt-oss-120b", messages=messages, max_tokens=300)
-    reply = response.choices[0].message.content
-    return {"reply": translate_text(reply, request.language)}
+def chatbot(request: ChatRequest, http_request: Request):
+    # an unknown or missing session_id gets a new session with a server-issued id
+    session_id, conversation = chat_store.get(
+        request.session_id,
+        profile=request.profile.model_dump() if request.profile is not None else None,
+        prediction=request.prediction,
+    )
+    messages = chat_store.build_messages(
+        conversation,
+        "You are Healthy(B), a multilingual diet and heart health expert.",
+        request.message,
+    )
+    start = time.monotonic()
+    budget = llm.slo.budget("chat")
+
+    def chat_fallback():
+        risk = profile_risk(HealthProfile(**conversation.profile)) if conversation.profile else None
+        if risk is None and conversation.prediction is not None:
+            risk = float(conversation.prediction)
+        return render_fallback("chat", conversation.profile, risk)
+
+    reply, fell_back = llm.complete_within(
+        "chat", messages, fallback=chat_fallback,
+        client_id=client_id(http_request), budget=budget, max_tokens=300,
+    )
+    if fell_back:
+        # templated answers are not part of the conversation history
+        return {"reply": reply, "session_id": session_id, "fallback": True}
+    chat_store.record(conversation, request.message, reply)
+    remaining = budget - (time.monotonic() - start) if llm.slo.enabled else None
+    return {"reply": translate_text(reply, request.language, budget=remaining), "session_id": session_id}
 
 
 if __name__ == "__main__":
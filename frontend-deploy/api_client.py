@@ -0,0 +1,133 @@
+# Backend client shared by both Streamlit frontends (streamlit_app.py at the
+# repo root imports this file too).
+#
+# - One pooled requests.Session per server process (st.cache_resource), with
+#   connect/read timeouts. Connection errors are retried for every method;
+#   502/503/504 only for idempotent ones. A POST that reached the backend is
+#   never re-sent, neither on a read timeout nor on an error status, so a
+#   slow or overloaded LLM call is not paid for twice.
+# - Results are memoized with st.cache_data, keyed on the profile, prediction
+#   and language, so Streamlit reruns and repeated button clicks don't call
+#   the backend (and the LLM) again. Templated fallback answers from the
+#   backend's SLO mode are returned but not cached.
+# - fetch_sections() requests the report sections in parallel.
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_URL = os.environ.get("BACKEND_URL", "http://127.0.0.1:8000").rstrip("/")
+CONNECT_TIMEOUT = float(os.environ.get("BACKEND_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.environ.get("BACKEND_READ_TIMEOUT", "60"))
+CACHE_TTL = int(os.environ.get("FRONTEND_CACHE_TTL", "3600"))
+
+# section -> (endpoint, response field, takes prediction, takes language)
+SECTIONS = {
+    "diet_plan": ("/diet-plan", "diet_plan", False, False),
+    "risk_report": ("/risk-report", "risk_report", True, True),
+    "lifestyle": ("/lifestyle", "lifestyle", False, True),
+    "doctor_note": ("/doctor-note", "doctor_note", True, True),
+}
+
+_base_url = API_URL
+
+
+def set_base_url(url):
+    global _base_url
+    _base_url = url.rstrip("/")
+
+
+@st.cache_resource
+def get_session():
+    retry = Retry(
+        total=3,
+        connect=3,
+        read=0,
+        other=0,
+        status=2,
+        status_forcelist=(502, 503, 504),
+        # connect retries ignore the method; read/status retries only apply to these,
+        # so POSTs are retried only when the connection was never made
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        backoff_factor=0.5,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=len(SECTIONS) * 2, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _post(base_url, path, payload, params=None):
+    res = get_session().post(
+        f"{base_url}{path}", json=payload, params=params, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+    )
+    res.raise_for_status()
+    return res.json()
+
+
+class _Fallback(Exception):
+    # carries a templated answer out of a cached function without caching it
+    def __init__(self, text):
+        super().__init__("fallback answer")
+        self.text = text
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=512, show_spinner=False)
+def _predict(base_url, profile):
+    return _post(base_url, "/predict", profile)["prediction"]
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=512, show_spinner=False)
+def _section(base_url, name, profile, prediction, language):
+    path, field, takes_prediction, takes_language = SECTIONS[name]
+    params = {}
+    if takes_prediction:
+        params["prediction"] = prediction
+    if takes_language:
+        params["language"] = language
+    data = _post(base_url, path, profile, params)
+    if data.get("fallback"):
+        raise _Fallback(data[field])
+    return data[field]
+
+
+def predict(profile):
+    return _predict(_base_url, profile)
+
+
+def section(name, profile, prediction, language="English"):
+    """One report section (diet_plan, risk_report, lifestyle, doctor_note)."""
+    _, _, takes_prediction, takes_language = SECTIONS[name]
+    # arguments the endpoint ignores must not split the cache
+    prediction = prediction if takes_prediction else None
+    language = language if takes_language else "English"
+    try:
+        return _section(_base_url, name, profile, prediction, language)
+    except _Fallback as e:
+        return e.text
+
+
+def fetch_sections(profile, prediction, language="English", names=tuple(SECTIONS)):
+    """
+    Several sections at once, requested in parallel. Returns
+    ({name: text}, {name: error message}) so one failing section doesn't hide the others.
+    """
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=len(names)) as pool:
+        futures = {name: pool.submit(section, name, profile, prediction, language) for name in names}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except requests.RequestException as e:
+                errors[name] = str(e)
+    return results, errors
+
+
+def chat(payload):
+    """Not cached: every message continues the conversation on the backend."""
+    return _post(_base_url, "/chat", payload)
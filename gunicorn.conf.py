@@ -0,0 +1,48 @@
+# Gunicorn settings for the FastAPI backend (used by the Procfile).
+#
+# With preload_app the app module, and the model artifacts, are loaded once
+# in the master before it forks the workers. gc.freeze() then moves every
+# object that exists at that point into a permanent generation the cyclic GC
+# never scans, so the collector does not write to (and un-share) those pages
+# in each worker. Artifacts from the manifest are loaded with mmap_mode="r",
+# so their numpy arrays live in read-only, file-backed shared pages anyway.
+
+import gc
+import os
+
+preload_app = os.getenv("PRELOAD_APP", "1") == "1"
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# the app splits per-service limits (LLM_GLOBAL_RPS) between this many workers
+os.environ["WEB_CONCURRENCY"] = str(workers)
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+
+def when_ready(server):
+    # runs in the master after the (preloaded) app is imported, before forking
+    if not preload_app:
+        return
+    from src.mlproject.predict_pipelines import get_predict_pipeline
+
+    pipeline = get_predict_pipeline()
+    if os.getenv("PREDICT_BACKEND", "pickle") != "onnx":
+        # the index needs sklearn; ONNX workers load it on first use instead
+        from src.mlproject.components.similarity_index import get_similarity_index
+
+        get_similarity_index()
+    server.log.info(f"Preloaded model artifacts (run_id={pipeline.run_id})")
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from src.mlproject.logger import configure_logging
+    from src.mlproject.process_stats import process_memory
+
+    # the listener thread configured in the master does not survive the fork
+    configure_logging()
+
+    server.log.info(f"Worker {worker.pid} started: {process_memory()}")
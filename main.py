@@ -1,25 +1,64 @@
-from src.mlproject.logger import logging
+from src.mlproject.logger import logging, configure_logging
 from src.mlproject.exception import CustomException
 import sys
+import argparse
 from src.mlproject.components.data_ingestion import DataIngestion
 from src.mlproject.components.data_ingestion import DataIngestionConfig
 from src.mlproject.components.data_transformation import DataTransformationConfig , DataTransformation 
 from src.mlproject.components.model_trainer import ModelTrainerConfig , ModelTrainer 
+from src.mlproject.components.model_evaluation import ModelEvaluation
+from src.mlproject.components.model_export import ModelExporter , onnx
+from src.mlproject.components.similarity_index import SimilarityIndexBuilder
+from src.mlproject.components.streaming_trainer import StreamingModelTrainer
+
+
+def run_streaming_training(source_path = None):
+    # out-of-core mode: chunked ingestion, one-pass preprocessor fit, partial_fit learners
+    data_ingestion = DataIngestion()
+    train_data_paths , test_data_paths = data_ingestion.initiate_streaming_ingestion(source_path)
+    data_transformation = DataTransformation()
+    preprocessor , preprocessor_path = data_transformation.initiate_streaming_transformation(train_data_paths)
+    streaming_trainer = StreamingModelTrainer()
+    print(streaming_trainer.initiate_streaming_training(train_data_paths , test_data_paths , preprocessor))
+    # reads the train split in chunks and keeps only a SIMILARITY_MAX_ROWS reservoir sample
+    similarity_index_builder = SimilarityIndexBuilder()
+    similarity_index = similarity_index_builder.initiate_similarity_index(train_data_paths , preprocessor_path , publish = False)
+    # publish only once every stage has succeeded, so a failure never breaks serving
+    streaming_trainer.publish_run(preprocessor , artifacts = {"similarity_index" : similarity_index})
+
 
 if __name__ =="__main__":
+    parser = argparse.ArgumentParser(description = "Run the training pipeline")
+    parser.add_argument("--streaming" , action = "store_true" , help = "out-of-core training for datasets that don't fit in memory")
+    parser.add_argument("--source" , default = None , help = "CSV to ingest in streaming mode (default: notebook/data/cleaned_data.csv)")
+    args = parser.parse_args()
+
+    configure_logging(name = "train")
     logging.info("the execution has started")
     
     try:
-        data_ingestion = DataIngestion()
-        # data_ingestion_config = DataIngestionConfig()
-        train_data_paths , test_data_paths = data_ingestion.initiate_data_ingestion()
-        # data_ingestion_config = DataIngestionConfig()
-        data_transformation = DataTransformation()
-        train_arr , test_arr , temp =  data_transformation.initiate_data_transformation(train_data_paths , test_data_paths)
-        model_trainer = ModelTrainer()
-        print(model_trainer.initiate_model_trainer(train_arr , test_arr))
+        if args.streaming:
+            run_streaming_training(args.source)
+        else:
+            data_ingestion = DataIngestion()
+            # data_ingestion_config = DataIngestionConfig()
+            train_data_paths , test_data_paths = data_ingestion.initiate_data_ingestion()
+            # data_ingestion_config = DataIngestionConfig()
+            data_transformation = DataTransformation()
+            train_arr , test_arr , temp =  data_transformation.initiate_data_transformation(train_data_paths , test_data_paths)
+            model_trainer = ModelTrainer()
+            print(model_trainer.initiate_model_trainer(train_arr , test_arr , preprocessor_path = temp))
+            # bootstrap CIs, ROC / PR curves and a threshold sweep for the chosen model
+            model_evaluation = ModelEvaluation()
+            model_evaluation.initiate_model_evaluation(test_arr , model_trainer.model_trainer_config.trained_model_file_path , run_id = model_trainer.parent_run_id)
+            similarity_index_builder = SimilarityIndexBuilder()
+            similarity_index_builder.initiate_similarity_index(train_data_paths , temp)
+            # optional: ONNX export for the onnxruntime serving backend
+            if onnx is not None:
+                model_exporter = ModelExporter()
+                model_exporter.initiate_model_export(temp , model_trainer.model_trainer_config.trained_model_file_path , test_data_paths)
         
         
     except Exception as e:
         logging.info("Custom Exception")
-        raise CustomException(e , sys)  
\ No newline at end of file
+        raise CustomException(e , sys)
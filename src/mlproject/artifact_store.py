@@ -0,0 +1,286 @@
+# Content-addressed store for the fitted preprocessor and model.
+#
+# Objects are serialized with joblib (uncompressed, so numpy arrays inside
+# the model can be memory-mapped on load) into a temp file, hashed, and then
+# renamed into  artifacts/objects/<sha256>.joblib. A training run is recorded
+# as a small JSON manifest that ties the preprocessor and model of that run
+# together; artifacts/manifest.json always points at the latest run.
+# Every write is write-to-temp + fsync + os.replace, so a reader never sees a
+# half written file. Only the last few run manifests are kept, and objects no
+# kept run refers to are deleted after each commit.
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import joblib
+
+from src.mlproject.exception import CustomException
+from src.mlproject.logger import logging
+
+
+@dataclass
+class ArtifactStoreConfig:
+    root_dir: str = os.getenv("ARTIFACT_STORE_DIR", "artifacts")
+    objects_dir_name: str = "objects"
+    runs_dir_name: str = "runs"
+    manifest_file_name: str = "manifest.json"
+    # run manifests kept by prune() (the current run is always kept); 0 keeps all
+    keep_runs: int = int(os.getenv("ARTIFACT_KEEP_RUNS", "5"))
+    # unreferenced objects younger than this may belong to a commit in progress
+    prune_grace_seconds: float = float(os.getenv("ARTIFACT_PRUNE_GRACE_SECONDS", "3600"))
+
+
+def _current_umask():
+    # os.umask() can only read the mask by replacing it, which would briefly
+    # change it for every thread in the process; read it from /proc instead
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    # no /proc (or a kernel without the field): the mode of a fresh file
+    # (misses execute bits, which never apply to 0666 files anyway)
+    probe_dir = tempfile.mkdtemp()
+    probe = os.path.join(probe_dir, "probe")
+    try:
+        os.close(os.open(probe, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666))
+        return 0o666 & ~os.stat(probe).st_mode & 0o777
+    finally:
+        if os.path.exists(probe):
+            os.remove(probe)
+        os.rmdir(probe_dir)
+
+
+# mkstemp creates files 0600; published files get the mode a plain open()
+# would give them (0666 minus the umask), so e.g. a serving user can read them.
+FILE_MODE = 0o666 & ~_current_umask()
+
+
+def _fsync_dir(dir_path):
+    # make the rename itself durable (not supported on Windows)
+    try:
+        fd = os.open(dir_path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_bytes(file_path, data: bytes):
+    dir_path = os.path.dirname(file_path) or "."
+    os.makedirs(dir_path, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dir_path, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(data)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.chmod(tmp_path, FILE_MODE)
+        os.replace(tmp_path, file_path)
+        _fsync_dir(dir_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_json(file_path, payload: dict):
+    atomic_write_bytes(file_path, json.dumps(payload, indent=2, sort_keys=True, default=str).encode("utf-8"))
+
+
+def file_sha256(file_path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    def __init__(self, config: ArtifactStoreConfig = None):
+        self.config = config or ArtifactStoreConfig()
+        self.objects_dir = os.path.join(self.config.root_dir, self.config.objects_dir_name)
+        self.runs_dir = os.path.join(self.config.root_dir, self.config.runs_dir_name)
+        self.manifest_path = os.path.join(self.config.root_dir, self.config.manifest_file_name)
+
+    # ---------------- objects ----------------
+    def put(self, obj):
+        """
+        Serialize obj into the store and return its entry (sha256, path, size).
+        Identical content is stored only once.
+        """
+        try:
+            os.makedirs(self.objects_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.objects_dir, prefix=".tmp-")
+            os.close(fd)
+            try:
+                joblib.dump(obj, tmp_path)
+                with open(tmp_path, "rb") as f:
+                    os.fsync(f.fileno())
+                sha = file_sha256(tmp_path)
+                final_path = os.path.join(self.objects_dir, f"{sha}.joblib")
+                if os.path.exists(final_path):
+                    os.remove(tmp_path)
+                    # a fresh mtime keeps prune() off an object a new run is reusing
+                    os.utime(final_path)
+                else:
+                    os.chmod(tmp_path, FILE_MODE)
+                    os.replace(tmp_path, final_path)
+                    _fsync_dir(self.objects_dir)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            return {"sha256": sha, "path": final_path, "size": os.path.getsize(final_path)}
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def get(self, entry: dict, mmap_mode="r", verify=True):
+        """
+        Load an object from its manifest entry. With mmap_mode="r" large numpy
+        arrays stay in the page cache and are shared by every process that
+        loads the same file.
+        """
+        try:
+            path = entry["path"]
+            if verify:
+                actual = file_sha256(path)
+                if actual != entry["sha256"]:
+                    raise ValueError(f"Checksum mismatch for {path}: expected {entry['sha256']}, got {actual}")
+            return joblib.load(path, mmap_mode=mmap_mode)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    # ---------------- runs ----------------
+    def commit_run(self, artifacts: dict, metadata: dict = None, run_id: str = None):
+        """
+        Store every object in `artifacts` ({"preprocessor": obj, "model": obj})
+        and publish a manifest for them. The manifest is only made current once
+        all objects are on disk.
+        """
+        try:
+            run_id = run_id or uuid.uuid4().hex
+            manifest = {
+                "run_id": run_id,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "artifacts": {name: self.put(obj) for name, obj in artifacts.items()},
+                "metadata": metadata or {},
+            }
+            atomic_write_json(os.path.join(self.runs_dir, f"{run_id}.json"), manifest)
+            atomic_write_json(self.manifest_path, manifest)
+            logging.info(f"Published artifact manifest for run {run_id}")
+            try:
+                self.prune()
+            except Exception as e:
+                # the run is published; leftover files are only wasted disk
+                logging.warning(f"Artifact pruning failed: {e}")
+            return manifest
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def update_run(self, artifacts: dict = None, metadata: dict = None, run_id: str = None):
+        """
+        Add objects and/or merge metadata into a run manifest (the current run
+        by default), e.g. artifacts derived after training such as an ONNX export.
+        """
+        try:
+            manifest = self.load_manifest(run_id)
+            if manifest is None:
+                raise ValueError("No artifact manifest to update")
+            for name, obj in (artifacts or {}).items():
+                manifest["artifacts"][name] = self.put(obj)
+            manifest["metadata"].update(metadata or {})
+            atomic_write_json(os.path.join(self.runs_dir, f"{manifest['run_id']}.json"), manifest)
+            current = self.load_manifest()
+            if current is not None and current["run_id"] == manifest["run_id"]:
+                atomic_write_json(self.manifest_path, manifest)
+            return manifest
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def load_manifest(self, run_id: str = None):
+        path = self.manifest_path if run_id is None else os.path.join(self.runs_dir, f"{run_id}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def load_run(self, run_id: str = None, mmap_mode="r", verify=True, names=None):
+        """
+        Return (manifest, {name: obj}) for a run, or (None, {}) if there is none.
+        `names` restricts loading to those artifacts, so a caller that needs the
+        model doesn't also hash and map e.g. the similarity index.
+        """
+        manifest = self.load_manifest(run_id)
+        if manifest is None:
+            return None, {}
+        objects = {
+            name: self.get(entry, mmap_mode=mmap_mode, verify=verify)
+            for name, entry in manifest["artifacts"].items()
+            if names is None or name in names
+        }
+        return manifest, objects
+
+    # ---------------- retention ----------------
+    def prune(self, keep_runs: int = None):
+        """
+        Delete all but the newest `keep_runs` run manifests (never the current
+        run), then every object that no remaining manifest refers to. Returns
+        the number of (runs, objects) removed.
+        """
+        keep_runs = self.config.keep_runs if keep_runs is None else keep_runs
+        if keep_runs <= 0 or not os.path.isdir(self.runs_dir):
+            return 0, 0
+
+        runs = []
+        for file_name in os.listdir(self.runs_dir):
+            if file_name.endswith(".json"):
+                with open(os.path.join(self.runs_dir, file_name)) as f:
+                    runs.append(json.load(f))
+        runs.sort(key=lambda run: run["created_at"], reverse=True)
+        current = self.load_manifest()
+        kept = runs[:keep_runs] + ([current] if current is not None else [])
+        kept_ids = {run["run_id"] for run in kept}
+
+        removed_runs = 0
+        for run in runs[keep_runs:]:
+            if run["run_id"] not in kept_ids:
+                os.remove(os.path.join(self.runs_dir, f"{run['run_id']}.json"))
+                removed_runs += 1
+
+        referenced = {
+            os.path.basename(entry["path"]) for run in kept for entry in run["artifacts"].values()
+        }
+        cutoff = time.time() - self.config.prune_grace_seconds
+        removed_objects = 0
+        for file_name in os.listdir(self.objects_dir):
+            path = os.path.join(self.objects_dir, file_name)
+            # temp files belong to a put() in progress
+            if file_name.startswith(".tmp-") or file_name in referenced:
+                continue
+            if os.path.getmtime(path) > cutoff:
+                continue
+            os.remove(path)
+            removed_objects += 1
+
+        if removed_runs or removed_objects:
+            logging.info(f"Pruned {removed_runs} artifact runs and {removed_objects} objects")
+        return removed_runs, removed_objects
@@ -0,0 +1,299 @@
+# Asynchronous batch scoring: POST /jobs uploads a CSV / Parquet file and
+# returns a job id; a small, niced process pool scores it chunk by chunk with
+# the published preprocessor + model and writes a CSV of results that
+# GET /jobs/{id}/result streams back.
+#
+# Job state lives in a local SQLite table, so it survives API restarts. A
+# job being scored holds a lease that the scoring process renews after every
+# chunk. A job whose lease has expired (its process died) or that was still
+# queued is picked up again by recover() at startup, or when it is polled.
+
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import pandas as pd
+
+from src.mlproject.exception import CustomException
+from src.mlproject.logger import logging
+from src.mlproject.features import encode_frame
+
+try:
+    import pyarrow.parquet as pq
+except Exception:
+    pq = None
+
+FORMATS = {".csv": "csv", ".parquet": "parquet", ".pq": "parquet"}
+
+
+@dataclass
+class BatchJobConfig:
+    jobs_dir: str = os.getenv("JOBS_DIR", os.path.join('artifacts', 'jobs'))
+    workers: int = int(os.getenv("JOBS_WORKERS", "1"))
+    # scoring processes run at lower CPU priority than the API workers
+    niceness: int = int(os.getenv("JOBS_NICE", "10"))
+    # BLAS / OpenMP threads per scoring process
+    threads: int = int(os.getenv("JOBS_THREADS", "1"))
+    chunksize: int = int(os.getenv("JOBS_CHUNKSIZE", "50000"))
+    lease_seconds: int = int(os.getenv("JOBS_LEASE_SECONDS", "120"))
+    max_upload_bytes: int = int(os.getenv("JOBS_MAX_UPLOAD_MB", "1024")) * 1024 * 1024
+
+    @property
+    def db_path(self):
+        return os.path.join(self.jobs_dir, "jobs.db")
+
+
+class JobStore:
+    """The SQLite job table; one short-lived connection per call, WAL so polling never blocks scoring."""
+
+    def __init__(self, config: BatchJobConfig = None):
+        self.config = config or BatchJobConfig()
+        os.makedirs(self.config.jobs_dir, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    filename TEXT,
+                    format TEXT NOT NULL,
+                    input_path TEXT NOT NULL,
+                    output_path TEXT NOT NULL,
+                    rows_total INTEGER,
+                    rows_done INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+
+    @contextmanager
+    def _connect(self):
+        # autocommit; each UPDATE below is atomic on its own
+        db = sqlite3.connect(self.config.db_path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def create(self, job_id, filename, fmt, input_path):
+        now = time.time()
+        output_path = os.path.join(self.config.jobs_dir, job_id, "result.csv")
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO jobs (id, status, filename, format, input_path, output_path, created_at, updated_at)"
+                " VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)",
+                (job_id, filename, fmt, input_path, output_path, now, now),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id):
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def claim(self, job_id, owner):
+        """Take the job if it is queued or its lease has run out; True if this owner got it."""
+        now = time.time()
+        with self._connect() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'running', rows_done = 0, error = NULL,"
+                " lease_owner = ?, lease_expires = ?, updated_at = ?"
+                " WHERE id = ? AND (status = 'queued' OR (status = 'running' AND lease_expires < ?))",
+                (owner, now + self.config.lease_seconds, now, job_id, now),
+            )
+            return cursor.rowcount == 1
+
+    def progress(self, job_id, owner, rows_done, rows_total=None):
+        """Record progress and renew the lease; False if another owner took the job over."""
+        now = time.time()
+        with self._connect() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET rows_done = ?, rows_total = COALESCE(?, rows_total),"
+                " lease_expires = ?, updated_at = ? WHERE id = ? AND lease_owner = ?",
+                (rows_done, rows_total, now + self.config.lease_seconds, now, job_id, owner),
+            )
+            return cursor.rowcount == 1
+
+    def finish(self, job_id, owner, status, error=None):
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_expires = NULL, updated_at = ?"
+                " WHERE id = ? AND lease_owner = ?",
+                (status, error, time.time(), job_id, owner),
+            )
+
+    def resumable(self):
+        """Ids of jobs that are queued or whose scoring process stopped renewing its lease."""
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_expires < ?)"
+                " ORDER BY created_at",
+                (time.time(),),
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+
+def _init_worker(config: BatchJobConfig):
+    os.nice(config.niceness)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(config.threads)
+    except Exception:
+        pass
+
+
+def _count_rows(path, fmt):
+    if fmt == "parquet":
+        return pq.ParquetFile(path).metadata.num_rows
+    newlines, last = 0, b"\n"
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            newlines += block.count(b"\n")
+            last = block[-1:]
+    # minus the header line, plus a final line without a trailing newline
+    return newlines - 1 + (last != b"\n")
+
+
+def _read_chunks(path, fmt, chunksize):
+    if fmt == "parquet":
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+def score_job(job_id, config: BatchJobConfig = None):
+    """Runs in a pool process: score one job's input into its result CSV."""
+    from src.mlproject.predict_pipelines import get_predict_pipeline
+
+    config = config or BatchJobConfig()
+    store = JobStore(config)
+    owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    if not store.claim(job_id, owner):
+        return None  # finished, or being scored by another process
+
+    job = store.get(job_id)
+    tmp_path = job["output_path"] + ".tmp"
+    try:
+        pipeline = get_predict_pipeline()
+        rows_total = _count_rows(job["input_path"], job["format"])
+        store.progress(job_id, owner, 0, rows_total)
+
+        rows_done = 0
+        with open(tmp_path, "w", newline="") as out:
+            for chunk in _read_chunks(job["input_path"], job["format"], config.chunksize):
+                risk = pipeline.predict_risk(encode_frame(chunk))
+                chunk = chunk.assign(risk=risk, prediction=(risk > 0.5).astype(int))
+                chunk.to_csv(out, index=False, header=rows_done == 0)
+                rows_done += len(chunk)
+                if not store.progress(job_id, owner, rows_done):
+                    raise RuntimeError("lease lost to another scoring process")
+
+        os.replace(tmp_path, job["output_path"])
+        store.finish(job_id, owner, "succeeded")
+        return rows_done
+
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        store.finish(job_id, owner, "failed", error=str(e))
+        # CustomException can't be unpickled in the parent; send its message
+        raise RuntimeError(str(CustomException(e, sys)))
+
+
+class JobRunner:
+    def __init__(self, config: BatchJobConfig = None):
+        self.config = config or BatchJobConfig()
+        self._store = None
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def store(self) -> JobStore:
+        if self._store is None:
+            self._store = JobStore(self.config)
+        return self._store
+
+    def _get_pool(self):
+        # created on first use in the serving worker (not the preloading
+        # gunicorn master); separate niced processes, so scoring never takes
+        # the API's request threads
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.config.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                        initargs=(self.config,),
+                    )
+        return self._pool
+
+    def submit(self, job_id):
+        future = self._get_pool().submit(score_job, job_id, self.config)
+        future.add_done_callback(
+            lambda f: f.exception() and logging.warning(f"Batch job {job_id} failed: {f.exception()}")
+        )
+
+    def create_job(self, fileobj, filename):
+        """Copy an upload to disk in blocks, register it and queue it for scoring."""
+        try:
+            ext = os.path.splitext(filename or "")[1].lower()
+            if ext not in FORMATS:
+                raise ValueError(f"Upload a .csv or .parquet file, got {filename!r}")
+            if FORMATS[ext] == "parquet" and pq is None:
+                raise ValueError("Parquet uploads need pyarrow installed")
+
+            job_id = uuid.uuid4().hex
+            job_dir = os.path.join(self.config.jobs_dir, job_id)
+            os.makedirs(job_dir, exist_ok=True)
+            input_path = os.path.join(job_dir, f"input{ext}")
+            written = 0
+            try:
+                with open(input_path, "wb") as out:
+                    for block in iter(lambda: fileobj.read(1 << 20), b""):
+                        written += len(block)
+                        if written > self.config.max_upload_bytes:
+                            raise ValueError(f"Upload exceeds {self.config.max_upload_bytes} bytes")
+                        out.write(block)
+            except BaseException:
+                shutil.rmtree(job_dir, ignore_errors=True)
+                raise
+
+            job = self.store.create(job_id, filename, FORMATS[ext], input_path)
+            self.submit(job_id)
+            logging.info(f"Batch job {job_id} queued ({written} bytes, {filename})")
+            return job
+
+        except ValueError:
+            raise
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def status(self, job_id):
+        job = self.store.get(job_id)
+        if job is not None and job["status"] == "running" and (job["lease_expires"] or 0) < time.time():
+            # its scoring process died without finishing; run it again
+            self.submit(job_id)
+        return job
+
+    def recover(self):
+        """Queue every job left unfinished by a previous API process."""
+        job_ids = self.store.resumable()
+        for job_id in job_ids:
+            self.submit(job_id)
+        if job_ids:
+            logging.info(f"Resumed {len(job_ids)} batch job(s)")
+        return job_ids
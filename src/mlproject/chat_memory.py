@@ -0,0 +1,246 @@
+# Server-side conversation memory for /chat.
+#
+# Conversations live in a local SQLite table (WAL, one short-lived connection
+# per call, as the batch job table) so every gunicorn worker sees the same
+# sessions: a follow-up may land on any worker. The least recently used
+# session is dropped once max_sessions is reached, so storage is capped by
+# session count. Session ids are always issued by the server; an unknown id
+# from a client starts a new session under a fresh id. The prompt for each
+# turn is: system prompt + optional patient context + a rolling summary of
+# old turns + as many recent turns as fit in the token budget. When the
+# history grows past the budget the oldest turns are folded into the summary,
+# so prompt size stays flat however long the chat runs.
+# Folding first appends the evicted turns to the summary and trims it; the
+# LLM summarizer then rewrites it on a background thread, so a /chat reply
+# never waits for a summary.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+
+@dataclass
+class ChatMemoryConfig:
+    max_sessions: int = int(os.getenv("CHAT_MAX_SESSIONS", "1000"))
+    history_token_budget: int = int(os.getenv("CHAT_HISTORY_TOKENS", "1200"))
+    summary_token_budget: int = int(os.getenv("CHAT_SUMMARY_TOKENS", "250"))
+    # background threads running the LLM summarizer
+    summary_workers: int = int(os.getenv("CHAT_SUMMARY_WORKERS", "2"))
+    # shared by all workers of the host
+    chat_dir: str = os.getenv("CHAT_DIR", os.path.join('artifacts', 'chat'))
+
+    @property
+    def db_path(self):
+        return os.path.join(self.chat_dir, "sessions.db")
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English; good enough for budgeting
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    max_chars = tokens * 4
+    return text if len(text) <= max_chars else text[-max_chars:]
+
+
+@dataclass
+class Conversation:
+    session_id: str
+    turns: deque = field(default_factory=deque)
+    summary: str = ""
+    profile: Optional[dict] = None
+    prediction: Optional[int] = None
+    # bumped on every fold; a background summary only replaces the one it was started from
+    summary_version: int = 0
+
+    def history_tokens(self):
+        return sum(estimate_tokens(t["content"]) for t in self.turns)
+
+
+class ConversationStore:
+    def __init__(self, config: ChatMemoryConfig = None, summarizer: Callable[[str, list], str] = None):
+        """
+        summarizer(previous_summary, evicted_turns) -> new summary, or None to
+        keep the trimmed one. It runs on a background thread; until it returns
+        (and whenever it fails) evicted turns are appended to the summary and trimmed.
+        """
+        self.config = config or ChatMemoryConfig()
+        self.summarizer = summarizer
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        os.makedirs(self.config.chat_dir, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                """CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    turns TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    summary_version INTEGER NOT NULL,
+                    profile TEXT,
+                    prediction INTEGER,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+
+    @contextmanager
+    def _connect(self):
+        # autocommit; multi-statement updates open their own transaction
+        db = sqlite3.connect(self.config.db_path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so a read-modify-write
+        # of a session is never interleaved with another worker's
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def __len__(self):
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    @staticmethod
+    def _load(db, session_id):
+        row = db.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        return Conversation(
+            session_id=row["id"],
+            turns=deque(json.loads(row["turns"])),
+            summary=row["summary"],
+            profile=json.loads(row["profile"]) if row["profile"] is not None else None,
+            prediction=row["prediction"],
+            summary_version=row["summary_version"],
+        )
+
+    def _save(self, db, conversation: Conversation):
+        db.execute(
+            "INSERT OR REPLACE INTO sessions (id, turns, summary, summary_version, profile, prediction, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                conversation.session_id,
+                json.dumps(list(conversation.turns)),
+                conversation.summary,
+                conversation.summary_version,
+                json.dumps(conversation.profile) if conversation.profile is not None else None,
+                conversation.prediction,
+                time.time(),
+            ),
+        )
+        # least recently used sessions beyond max_sessions
+        db.execute(
+            "DELETE FROM sessions WHERE id IN"
+            " (SELECT id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.config.max_sessions,),
+        )
+
+    def get(self, session_id: Optional[str] = None, profile: Optional[dict] = None, prediction: Optional[int] = None):
+        """
+        Return (session_id, Conversation) for a session this server issued,
+        or a new session under a fresh id (never the client's). A profile /
+        prediction, when given, is stored with the session.
+        """
+        with self._transaction() as db:
+            conversation = self._load(db, session_id) if session_id else None
+            if conversation is None:
+                conversation = Conversation(session_id=uuid.uuid4().hex)
+            if profile is not None:
+                conversation.profile = profile
+            if prediction is not None:
+                conversation.prediction = prediction
+            self._save(db, conversation)
+            return conversation.session_id, conversation
+
+    def build_messages(self, conversation: Conversation, system_prompt: str, message: str):
+        messages = [{"role": "system", "content": system_prompt}]
+        if conversation.profile is not None:
+            context = ", ".join(f"{k}: {v}" for k, v in conversation.profile.items())
+            if conversation.prediction is not None:
+                context += f". Predicted heart disease risk: {'High' if conversation.prediction else 'Low'}"
+            messages.append({"role": "system", "content": f"Patient profile: {context}"})
+        if conversation.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {conversation.summary}"})
+        messages.extend(conversation.turns)
+        messages.append({"role": "user", "content": message})
+        return messages
+
+    def record(self, conversation: Conversation, message: str, reply: str):
+        """Append a turn to the stored session (its latest state, which another worker may have changed)."""
+        with self._transaction() as db:
+            stored = self._load(db, conversation.session_id)
+            if stored is None:
+                # evicted meanwhile: keep what this request knew
+                stored = Conversation(
+                    session_id=conversation.session_id, profile=conversation.profile, prediction=conversation.prediction
+                )
+            stored.turns.append({"role": "user", "content": message})
+            stored.turns.append({"role": "assistant", "content": reply})
+            folded = self._fold(stored)
+            self._save(db, stored)
+
+        if folded is not None and self.summarizer is not None:
+            previous, evicted = folded
+            self._get_executor().submit(self._summarize, stored.session_id, stored.summary_version, previous, evicted)
+
+    def _fold(self, conversation: Conversation):
+        """Fold the oldest turns into the summary if over budget; returns (previous summary, evicted) or None."""
+        if conversation.history_tokens() <= self.config.history_token_budget:
+            return None
+
+        # fold the oldest turns until history is back to half the budget, so
+        # the summarizer runs once every few turns rather than on every turn
+        evicted = []
+        while conversation.turns and conversation.history_tokens() > self.config.history_token_budget // 2:
+            evicted.append(conversation.turns.popleft())
+
+        previous = conversation.summary
+        folded = " ".join(f"{t['role']}: {t['content']}" for t in evicted)
+        conversation.summary = truncate_to_tokens(f"{previous} {folded}".strip(), self.config.summary_token_budget)
+        conversation.summary_version += 1
+        return previous, evicted
+
+    def _get_executor(self):
+        # created on first use, in the serving worker rather than the preloading master
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.config.summary_workers, thread_name_prefix="chat-summary"
+                    )
+        return self._executor
+
+    def _summarize(self, session_id: str, version: int, previous: str, evicted: list):
+        # runs outside any transaction, so the next turn is never blocked
+        try:
+            summary = self.summarizer(previous, evicted)
+        except Exception:
+            summary = None
+        if not summary:
+            return
+        with self._connect() as db:
+            # only replaces the summary it was started from
+            db.execute(
+                "UPDATE sessions SET summary = ? WHERE id = ? AND summary_version = ?",
+                (truncate_to_tokens(summary, self.config.summary_token_budget), session_id, version),
+            )
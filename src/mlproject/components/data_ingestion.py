@@ -7,7 +7,7 @@ import sys
 from src.mlproject.exception import CustomException
 from src.mlproject.logger import logging
 import pandas as pd
-from src.mlproject.utils import read_sql_data
+from src.mlproject.utils import read_sql_data , read_sql_chunks
 from sklearn.model_selection import train_test_split
 from dataclasses import dataclass
 
@@ -33,6 +33,9 @@ class DataIngestionConfig:
     test_data_path:str = os.path.join('artifact' , 'test.csv')
     raw_data_path:str = os.path.join('artifact' , 'raw.csv')
     raw_data_path_2:str = os.path.join('notebook\data' , 'raw.csv')
+    # streaming mode: rows whose hash falls below this percentage go to test
+    test_percent:int = 20
+    chunksize:int = 100_000
 # this indicate the path where training and testing data store after spliting
 
 # DataIngestionConfig (A configuration class):
@@ -58,14 +61,17 @@ class DataIngestion:
     
     def initiate_data_ingestion(self):
         try:
-            # df = read_sql_data()
-            # Use repo-relative dataset to ensure portability across machines
-            from pathlib import Path
-            repo_root = Path(__file__).resolve().parents[3]
-            df_path = repo_root / 'notebook' / 'data' / 'cleaned_data.csv'
-            df = pd.read_csv(df_path)
-            ###reading the data from mysql
-            logging.info("reading completed mysql database")    
+            if os.getenv("DATA_SOURCE", "csv") == "sql":
+                ###reading the data from mysql (incremental, chunked)
+                df = read_sql_data()
+                logging.info("reading completed mysql database")    
+            else:
+                # Use repo-relative dataset to ensure portability across machines
+                from pathlib import Path
+                repo_root = Path(__file__).resolve().parents[3]
+                df_path = repo_root / 'notebook' / 'data' / 'cleaned_data.csv'
+                df = pd.read_csv(df_path)
+                logging.info("reading completed csv dataset")
             
             os.makedirs(os.path.dirname(self.ingestion_config.raw_data_path_2), exist_ok=True)
             os.makedirs(os.path.dirname(self.ingestion_config.train_data_path) , exist_ok = True)
@@ -87,7 +93,46 @@ class DataIngestion:
             )
             
         except Exception as e:
-            raise CustomException(e , sys)    
-        
-    
+            raise CustomException(e , sys)
+
+    def initiate_streaming_ingestion(self , source_path = None):
+        """
+        Out-of-core variant of initiate_data_ingestion for extracts that don't
+        fit in memory: the source is read in chunks and each row goes to train
+        or test by a hash of its contents, so the split is deterministic
+        without loading or shuffling the whole dataset. With DATA_SOURCE=sql
+        (and no source_path) the chunks come from the pulled SQL part files.
+        """
+        try:
+            from pathlib import Path
+            if source_path is None and os.getenv("DATA_SOURCE", "csv") == "sql":
+                logging.info("Streaming ingestion from the SQL part files")
+                chunks = read_sql_chunks(self.ingestion_config.chunksize)
+            else:
+                if source_path is None:
+                    repo_root = Path(__file__).resolve().parents[3]
+                    source_path = repo_root / 'notebook' / 'data' / 'cleaned_data.csv'
+                logging.info(f"Streaming ingestion from {source_path}")
+                chunks = pd.read_csv(source_path , chunksize = self.ingestion_config.chunksize)
 
+            os.makedirs(os.path.dirname(self.ingestion_config.train_data_path) , exist_ok = True)
+            train_rows = test_rows = 0
+            first = True
+            for chunk in chunks:
+                bucket = pd.util.hash_pandas_object(chunk , index = False).to_numpy() % 100
+                is_test = bucket < self.ingestion_config.test_percent
+                mode = 'w' if first else 'a'
+                chunk[~is_test].to_csv(self.ingestion_config.train_data_path , mode = mode , index = False , header = first)
+                chunk[is_test].to_csv(self.ingestion_config.test_data_path , mode = mode , index = False , header = first)
+                train_rows += int((~is_test).sum())
+                test_rows += int(is_test.sum())
+                first = False
+
+            logging.info(f"Streaming ingestion completed: {train_rows} train rows, {test_rows} test rows")
+            return(
+                self.ingestion_config.train_data_path,
+                self.ingestion_config.test_data_path
+            )
+
+        except Exception as e:
+            raise CustomException(e , sys)
@@ -12,10 +12,71 @@ from sklearn.preprocessing import LabelEncoder
 
 import os
 from src.mlproject.utils import save_object
+from src.mlproject.features import FEATURE_COLUMNS
 
 @dataclass
 class DataTransformationConfig:
     preprocessor_obj_file_path = os.path.join('artifact', 'preprocessor.pkl')
+    chunksize = 100_000
+    # rows kept to estimate the imputation medians in streaming mode
+    median_sample_size = 100_000
+
+
+class StreamingPreprocessor:
+    """
+    Same transform as the batch preprocessor (median impute, then standard
+    scale) but fitted in one streaming pass with bounded memory:
+    - medians come from a fixed-size uniform reservoir sample of rows
+    - means/variances are accumulated on the observed values and then
+      corrected for the median-filled missing ones, which gives exactly the
+      statistics the batch StandardScaler would see after imputation
+    """
+
+    def __init__(self, columns, sample_size=100_000, random_state=42):
+        self.columns = list(columns)
+        self.feature_names_in_ = np.array(self.columns, dtype=object)
+        self.sample_size = sample_size
+        self.rng = np.random.default_rng(random_state)
+        self.reservoir = np.empty((0, len(self.columns)))
+        self.n_seen = 0
+        self.n_missing = np.zeros(len(self.columns))
+        self.scaler = StandardScaler()
+
+    def partial_fit(self, df):
+        x = df[self.columns].to_numpy(dtype=np.float64)
+        self.scaler.partial_fit(x)  # NaNs are ignored
+        self.n_missing += np.isnan(x).sum(axis=0)
+
+        free = self.sample_size - len(self.reservoir)
+        if free > 0:
+            self.reservoir = np.vstack([self.reservoir, x[:free]])
+        rest = x[max(free, 0):]
+        if len(rest):
+            # reservoir sampling (algorithm R), vectorized over the chunk
+            positions = self.n_seen + max(free, 0) + np.arange(len(rest))
+            slots = self.rng.integers(0, positions + 1)
+            keep = slots < self.sample_size
+            self.reservoir[slots[keep]] = rest[keep]
+        self.n_seen += len(x)
+        return self
+
+    def finalize(self):
+        self.statistics_ = np.nanmedian(self.reservoir, axis=0)
+        n_obs = np.broadcast_to(self.scaler.n_samples_seen_, self.n_missing.shape).astype(np.float64)
+        n_total = n_obs + self.n_missing
+        mean = (n_obs * self.scaler.mean_ + self.n_missing * self.statistics_) / n_total
+        var = (n_obs * (self.scaler.var_ + (self.scaler.mean_ - mean) ** 2)
+               + self.n_missing * (self.statistics_ - mean) ** 2) / n_total
+        self.mean_ = mean
+        self.scale_ = np.where(var > 0, np.sqrt(var), 1.0)
+        # the sample is only needed while fitting
+        self.reservoir = None
+        return self
+
+    def transform(self, df):
+        x = df[self.columns].to_numpy(dtype=np.float64)
+        x = np.where(np.isnan(x), self.statistics_, x)
+        return (x - self.mean_) / self.scale_
 
 class DataTransformation:
     def __init__(self):
@@ -107,3 +168,34 @@ class DataTransformation:
 
         except Exception as e:
             raise CustomException(e, sys)
+
+    def initiate_streaming_transformation(self, train_path):
+        """
+        Fit a StreamingPreprocessor over the training file in one chunked
+        pass. Unlike initiate_data_transformation nothing is materialized: the
+        trainer transforms chunks on the fly.
+        """
+        try:
+            # the model's features only: any other column in the source (an id,
+            # a SQL watermark, ...) must not become a feature
+            preprocessing_obj = StreamingPreprocessor(
+                FEATURE_COLUMNS, self.data_transformation_config.median_sample_size
+            )
+            for chunk in pd.read_csv(train_path, chunksize=self.data_transformation_config.chunksize):
+                preprocessing_obj.partial_fit(chunk)
+            preprocessing_obj.finalize()
+            logging.info(f"Fitted streaming preprocessor over {preprocessing_obj.n_seen} rows")
+
+            save_object(
+                file_path=self.data_transformation_config.preprocessor_obj_file_path,
+                obj=preprocessing_obj
+            )
+            logging.info("Saved preprocessing object")
+
+            return (
+                preprocessing_obj,
+                self.data_transformation_config.preprocessor_obj_file_path
+            )
+
+        except Exception as e:
+            raise CustomException(e, sys)
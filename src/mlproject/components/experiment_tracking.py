@@ -0,0 +1,184 @@
+# Asynchronous, batched MLflow logging for the trainer.
+#
+# Calls only enqueue work; a background thread creates runs and sends
+# metrics/params/tags with MlflowClient.log_batch, grouping everything queued
+# for a run into as few requests as MLflow's batch limits allow. Runs are
+# referred to by local keys so even run creation never blocks training, and
+# close() only asks the worker to finish: the queue is drained in the
+# background (bounded by MLFLOW_ASYNC_DRAIN_TIMEOUT at interpreter exit).
+
+import atexit
+import os
+import queue
+import threading
+import time
+import uuid
+
+from mlflow.entities import Metric, Param, RunTag
+from mlflow.tracking import MlflowClient
+
+from src.mlproject.logger import logging
+
+# MLflow log_batch limits per request
+MAX_METRICS = 1000
+MAX_PARAMS = 100
+MAX_TAGS = 100
+
+# seconds the interpreter waits at exit for logging that is still queued
+DRAIN_TIMEOUT = float(os.getenv("MLFLOW_ASYNC_DRAIN_TIMEOUT", "60"))
+
+_STOP = object()
+
+
+class AsyncMlflowLogger:
+    def __init__(self, client: MlflowClient = None, experiment_name: str = None, flush_interval: float = 0.5):
+        self.client = client or MlflowClient()
+        self.experiment_name = experiment_name or os.getenv("MLFLOW_EXPERIMENT_NAME", "Default")
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._run_ids = {}
+        self._created = {}    # run key -> Event set once creation succeeded or failed
+        self._skipped = set()  # run keys whose creation failed (warned once each)
+        self._errors = 0
+        self._thread = threading.Thread(target=self._worker, name="mlflow-logger", daemon=True)
+        self._thread.start()
+        atexit.register(self._drain)
+
+    # ---------------- producer side (training thread) ----------------
+    def start_run(self, name: str, parent: str = None, tags: dict = None) -> str:
+        key = uuid.uuid4().hex
+        self._created[key] = threading.Event()
+        self._queue.put(("start", key, {"name": name, "parent": parent, "tags": tags or {}}))
+        return key
+
+    def log(self, run: str, metrics: dict = None, params: dict = None, tags: dict = None, step: int = 0):
+        self._queue.put(("log", run, {"metrics": metrics or {}, "params": params or {}, "tags": tags or {}, "step": step}))
+
+    def end_run(self, run: str, status: str = "FINISHED"):
+        self._queue.put(("end", run, {"status": status}))
+
+    def run_id(self, run: str, timeout: float = None):
+        """
+        MLflow run id for a key, or None if the run could not be created. With
+        a timeout, waits up to that long for the worker to create this run
+        (not for the rest of the queue).
+        """
+        if timeout is not None and run in self._created:
+            self._created[run].wait(timeout)
+        return self._run_ids.get(run)
+
+    def close(self, timeout: float = None):
+        """
+        Stop the worker once everything queued is sent. Returns immediately
+        unless a timeout is given; whatever is still queued at interpreter
+        exit gets up to DRAIN_TIMEOUT seconds.
+        """
+        self._queue.put(_STOP)
+        if timeout is not None:
+            self._thread.join(timeout)
+
+    def _drain(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(DRAIN_TIMEOUT)
+
+    # ---------------- consumer side (background thread) ----------------
+    def _experiment_id(self):
+        experiment = self.client.get_experiment_by_name(self.experiment_name)
+        if experiment is not None:
+            return experiment.experiment_id
+        return self.client.create_experiment(self.experiment_name)
+
+    def _worker(self):
+        experiment_id = None
+        stop = False
+        while not stop:
+            items = [self._queue.get()]
+            # gather whatever else arrives within the flush interval into one batch
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                try:
+                    items.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            if _STOP in items:
+                stop = True
+                items = [item for item in items if item is not _STOP]
+
+            try:
+                if experiment_id is None and items:
+                    experiment_id = self._experiment_id()
+                self._process(experiment_id, items)
+            except Exception as e:
+                self._errors += 1
+                logging.warning(f"MLflow logging failed: {e}")
+            finally:
+                # never leave run_id(..., timeout) waiting on a run this batch didn't create
+                for kind, key, _ in items:
+                    if kind == "start":
+                        self._created[key].set()
+
+        if self._errors:
+            logging.warning(f"MLflow logging: {self._errors} request(s) failed")
+
+    def _skip(self, key, reason):
+        if key not in self._skipped:
+            self._skipped.add(key)
+            logging.warning(f"MLflow logging: dropping everything logged to a run that {reason}")
+
+    def _process(self, experiment_id, items):
+        pending = {}  # run key -> (metrics, params, tags)
+        ends = []
+        for kind, key, payload in items:
+            if kind == "start":
+                tags = dict(payload["tags"], **{"mlflow.runName": payload["name"]})
+                if payload["parent"] is not None and payload["parent"] in self._run_ids:
+                    tags["mlflow.parentRunId"] = self._run_ids[payload["parent"]]
+                try:
+                    run = self.client.create_run(experiment_id, tags=tags, run_name=payload["name"])
+                    self._run_ids[key] = run.info.run_id
+                except Exception as e:
+                    self._errors += 1
+                    self._skip(key, f"could not be created ({payload['name']}: {e})")
+                finally:
+                    self._created[key].set()
+            elif kind == "log":
+                metrics, params, tags = pending.setdefault(key, ([], {}, {}))
+                timestamp = int(time.time() * 1000)
+                metrics.extend(
+                    Metric(k, float(v), timestamp, payload["step"]) for k, v in payload["metrics"].items()
+                )
+                params.update({k: str(v) for k, v in payload["params"].items()})
+                tags.update({k: str(v) for k, v in payload["tags"].items()})
+            elif kind == "end":
+                ends.append((key, payload["status"]))
+
+        # each run is sent on its own, so one failing run doesn't drop the others
+        for key, (metrics, params, tags) in pending.items():
+            if key not in self._run_ids:
+                self._skip(key, "was never created")
+                continue
+            run_id = self._run_ids[key]
+            params, tags = list(params.items()), list(tags.items())
+            try:
+                while metrics or params or tags:
+                    self.client.log_batch(
+                        run_id,
+                        metrics=metrics[:MAX_METRICS],
+                        params=[Param(k, v) for k, v in params[:MAX_PARAMS]],
+                        tags=[RunTag(k, v) for k, v in tags[:MAX_TAGS]],
+                    )
+                    metrics, params, tags = metrics[MAX_METRICS:], params[MAX_PARAMS:], tags[MAX_TAGS:]
+            except Exception as e:
+                self._errors += 1
+                logging.warning(f"MLflow logging to run {run_id} failed: {e}")
+
+        for key, status in ends:
+            if key not in self._run_ids:
+                self._skip(key, "was never created")
+                continue
+            try:
+                self.client.set_terminated(self._run_ids[key], status=status)
+            except Exception as e:
+                self._errors += 1
+                logging.warning(f"MLflow could not end run {self._run_ids[key]}: {e}")
@@ -0,0 +1,245 @@
+# Bootstrapped evaluation of the published model on the test split.
+#
+# Test rows are sorted by predicted risk once. A block of bootstrap resamples
+# is then a (resamples x rows) matrix of draw counts, and one cumulative sum
+# along the rows gives the weighted TP / FP counts of every resample at every
+# cut-off. ROC AUC, average precision and the confusion counts at each
+# threshold of the sweep are read off those sums, with no Python loop per
+# resample. Blocks are sized to bound memory and run in parallel with joblib.
+
+import os
+import sys
+import time
+import warnings
+from dataclasses import dataclass
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.metrics import precision_recall_curve, roc_curve
+
+from src.mlproject.exception import CustomException
+from src.mlproject.logger import logging
+from src.mlproject.artifact_store import ArtifactStore
+from src.mlproject.utils import load_object
+
+THRESHOLD_METRICS = ("accuracy", "precision", "recall", "f1_score")
+
+
+@dataclass
+class ModelEvaluationConfig:
+    n_resamples = int(os.getenv("EVAL_BOOTSTRAP_RESAMPLES", "2000"))
+    confidence = float(os.getenv("EVAL_CONFIDENCE", "0.95"))
+    # thresholds 0, 0.01, ..., 1 by default; the serving threshold is 0.5
+    n_thresholds = int(os.getenv("EVAL_THRESHOLDS", "101"))
+    decision_threshold = 0.5
+    # resamples x rows cells per block (~4 int64 arrays of this size per worker)
+    block_cells = int(os.getenv("EVAL_BLOCK_CELLS", "2000000"))
+    n_jobs = int(os.getenv("EVAL_N_JOBS", "-1"))
+    seed = int(os.getenv("EVAL_SEED", "42"))
+    # ROC / PR curves are downsampled to this many points for the manifest
+    curve_points = 200
+
+
+def _divide(num, den):
+    # 0/0 (e.g. no predicted positives) is undefined, not 0
+    return np.divide(num, den, out=np.full(np.broadcast(num, den).shape, np.nan), where=den > 0)
+
+
+def _metrics(weights, y, distinct, cutoffs):
+    """
+    Metrics for each row of weights (draw counts per test row, rows sorted by
+    descending risk). distinct: last index of each run of tied scores.
+    cutoffs: for each threshold, the number of rows with risk above it.
+    """
+    tp = np.cumsum(weights * y, axis=1)
+    fp = np.cumsum(weights, axis=1) - tp
+    positives, negatives = tp[:, -1:], fp[:, -1:]
+    total = positives + negatives
+
+    # ROC AUC and average precision over the distinct cut-offs
+    tp_d, fp_d = tp[:, distinct], fp[:, distinct]
+    zero = np.zeros((len(weights), 1))
+    tpr = np.hstack([zero, _divide(tp_d, positives)])
+    fpr = np.hstack([zero, _divide(fp_d, negatives)])
+    roc_auc = np.sum(np.diff(fpr, axis=1) * (tpr[:, 1:] + tpr[:, :-1]) / 2, axis=1)
+    precision_d = np.divide(tp_d, tp_d + fp_d, out=np.zeros(tp_d.shape), where=(tp_d + fp_d) > 0)
+    average_precision = np.sum(np.diff(tpr, axis=1) * precision_d, axis=1)
+
+    # confusion counts at every threshold of the sweep
+    zero = np.zeros((len(weights), 1), dtype=tp.dtype)
+    tp_t = np.hstack([zero, tp])[:, cutoffs]
+    fp_t = np.hstack([zero, fp])[:, cutoffs]
+    sweep = {
+        "accuracy": (tp_t + negatives - fp_t) / total,
+        "precision": _divide(tp_t, tp_t + fp_t),
+        "recall": _divide(tp_t, np.broadcast_to(positives, tp_t.shape)),
+        "f1_score": _divide(2 * tp_t, tp_t + fp_t + positives),
+    }
+    return {"roc_auc": roc_auc, "average_precision": average_precision}, sweep
+
+
+def _bootstrap_block(seed, resamples, y, distinct, cutoffs):
+    n = len(y)
+    rng = np.random.default_rng(seed)
+    draws = rng.integers(0, n, size=(resamples, n)) + (np.arange(resamples) * n)[:, None]
+    weights = np.bincount(draws.ravel(), minlength=resamples * n).reshape(resamples, n)
+    return _metrics(weights, y, distinct, cutoffs)
+
+
+def _percentiles(samples, q):
+    # all-NaN columns (a metric undefined in every resample) give NaN quietly
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanpercentile(samples, q, axis=0), np.nanstd(samples, axis=0)
+
+
+def _clean(values, digits=6):
+    # JSON-safe: NaN / inf (undefined metrics, the curve's first threshold) -> null
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 0:
+        return round(float(values), digits) if np.isfinite(values) else None
+    return [round(float(v), digits) if np.isfinite(v) else None for v in values]
+
+
+def _downsample(n, points):
+    if n <= points:
+        return np.arange(n)
+    return np.unique(np.linspace(0, n - 1, points).round().astype(int))
+
+
+class ModelEvaluation:
+    def __init__(self):
+        self.model_evaluation_config = ModelEvaluationConfig()
+
+    def bootstrap(self, y_true, risk):
+        """
+        Point estimates and bootstrap confidence intervals for ROC AUC,
+        average precision and, at every threshold of the sweep, accuracy,
+        precision, recall and F1. Returns the report dict.
+        """
+        try:
+            config = self.model_evaluation_config
+            start = time.perf_counter()
+            y_true = np.asarray(y_true).astype(np.int64).ravel()
+            risk = np.asarray(risk, dtype=np.float64).ravel()
+            n = len(y_true)
+            if n == 0:
+                raise ValueError("Cannot evaluate on an empty test set")
+
+            order = np.argsort(-risk, kind="mergesort")
+            y, sorted_risk = y_true[order], risk[order]
+            distinct = np.r_[np.flatnonzero(np.diff(sorted_risk)), n - 1]
+            thresholds = np.linspace(0.0, 1.0, config.n_thresholds)
+            # predicted positive when risk > threshold, like predict()
+            cutoffs = n - np.searchsorted(sorted_risk[::-1], thresholds, side="right")
+
+            point, point_sweep = _metrics(np.ones((1, n), dtype=np.int64), y, distinct, cutoffs)
+
+            per_block = max(1, min(config.n_resamples, config.block_cells // n))
+            sizes = [per_block] * (config.n_resamples // per_block)
+            if config.n_resamples % per_block:
+                sizes.append(config.n_resamples % per_block)
+            seeds = np.random.SeedSequence(config.seed).spawn(len(sizes))
+            # a single block isn't worth starting worker processes for
+            n_jobs = config.n_jobs if len(sizes) > 1 else 1
+            blocks = Parallel(n_jobs=n_jobs)(
+                delayed(_bootstrap_block)(seed, size, y, distinct, cutoffs) for seed, size in zip(seeds, sizes)
+            )
+            scalars = {k: np.concatenate([b[0][k] for b in blocks]) for k in point}
+            sweeps = {k: np.concatenate([b[1][k] for b in blocks]) for k in THRESHOLD_METRICS}
+
+            q = [50 * (1 - config.confidence), 50 * (1 + config.confidence)]
+
+            def interval(samples, value):
+                (low, high), std = _percentiles(samples, q)
+                return {"value": _clean(value), "ci_low": _clean(low), "ci_high": _clean(high), "std": _clean(std)}
+
+            # the serving threshold's column of the sweep
+            at = int(np.argmin(np.abs(thresholds - config.decision_threshold)))
+            metrics = {k: interval(sweeps[k][:, at], point_sweep[k][0, at]) for k in THRESHOLD_METRICS}
+            metrics.update({k: interval(scalars[k], point[k][0]) for k in point})
+
+            sweep = {"thresholds": _clean(thresholds)}
+            for k in THRESHOLD_METRICS:
+                (low, high), _ = _percentiles(sweeps[k], q)
+                sweep[k] = {"value": _clean(point_sweep[k][0]), "ci_low": _clean(low), "ci_high": _clean(high)}
+
+            fpr, tpr, roc_thresholds = roc_curve(y_true, risk)
+            precision, recall, pr_thresholds = precision_recall_curve(y_true, risk)
+            roc_idx = _downsample(len(fpr), config.curve_points)
+            pr_idx = _downsample(len(pr_thresholds), config.curve_points)
+            best_f1 = np.argmax(np.nan_to_num(point_sweep["f1_score"][0], nan=-1.0))
+
+            report = {
+                "n_samples": n,
+                "positives": int(y_true.sum()),
+                "n_resamples": config.n_resamples,
+                "confidence": config.confidence,
+                "decision_threshold": float(thresholds[at]),
+                "metrics": metrics,
+                "best_f1_threshold": float(thresholds[best_f1]),
+                "threshold_sweep": sweep,
+                "roc_curve": {"fpr": _clean(fpr[roc_idx]), "tpr": _clean(tpr[roc_idx]),
+                              "thresholds": _clean(roc_thresholds[roc_idx])},
+                "pr_curve": {"precision": _clean(precision[pr_idx]), "recall": _clean(recall[pr_idx]),
+                             "thresholds": _clean(pr_thresholds[pr_idx])},
+                "blocks": len(sizes),
+                "seconds": round(time.perf_counter() - start, 3),
+            }
+            logging.info(
+                f"Bootstrap evaluation of {n} rows x {config.n_resamples} resamples in {report['seconds']} s: "
+                + ", ".join(f"{k} {m['value']} [{m['ci_low']}, {m['ci_high']}]" for k, m in metrics.items())
+            )
+            return report
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def log_to_mlflow(self, report, run_id):
+        """Interval metrics and the sweep on the model-selection run, full report as evaluation.json."""
+        from mlflow.entities import Metric
+        from mlflow.tracking import MlflowClient
+        from src.mlproject.components.experiment_tracking import MAX_METRICS
+
+        now = int(time.time() * 1000)
+        metrics = [
+            Metric(f"eval_{name}" + ("" if field == "value" else f"_{field}"), value, now, 0)
+            for name, m in report["metrics"].items()
+            for field, value in m.items() if value is not None
+        ]
+        # one point per threshold; the step is the threshold's index in the sweep
+        sweep = report["threshold_sweep"]
+        metrics += [
+            Metric(f"sweep_{name}", value, now, step)
+            for name in THRESHOLD_METRICS
+            for step, value in enumerate(sweep[name]["value"]) if value is not None
+        ]
+        client = MlflowClient()
+        for i in range(0, len(metrics), MAX_METRICS):
+            client.log_batch(run_id, metrics=metrics[i:i + MAX_METRICS])
+        client.log_dict(run_id, report, "evaluation.json")
+
+    def initiate_model_evaluation(self, test_array, model_path, run_id=None):
+        """
+        Evaluation step run after ModelTrainer: bootstrap the trained model on
+        the (preprocessed) test split and record the report in the current
+        run manifest and, given its id, the MLflow model-selection run.
+        """
+        try:
+            model = load_object(model_path)
+            X_test, y_test = test_array[:, :-1], test_array[:, -1]
+            report = self.bootstrap(y_test, model.predict_proba(X_test)[:, 1])
+
+            store = ArtifactStore()
+            if store.load_manifest() is not None:
+                store.update_run(metadata={"evaluation": report})
+
+            if run_id is not None:
+                try:
+                    self.log_to_mlflow(report, run_id)
+                except Exception as mlfe:
+                    logging.warning(f"MLflow logging skipped due to: {mlfe}")
+            return report
+
+        except Exception as e:
+            raise CustomException(e, sys)
@@ -0,0 +1,199 @@
+import os
+import sys
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from src.mlproject.exception import CustomException
+from src.mlproject.logger import logging
+from src.mlproject.artifact_store import ArtifactStore, atomic_write_bytes
+from src.mlproject.utils import load_object
+from src.mlproject.what_if import feature_spreads
+
+# ONNX conversion is only needed at training time; serving needs onnxruntime
+try:
+    import onnx
+    from skl2onnx import convert_sklearn, update_registered_converter
+    from skl2onnx.common.data_types import FloatTensorType
+    from skl2onnx.common.shape_calculator import calculate_linear_classifier_output_shapes
+    from sklearn.pipeline import Pipeline
+except Exception:
+    onnx = None
+
+from src.mlproject.onnx_serving import INTRA_OP_THREADS, make_session, run_onnx
+
+
+@dataclass
+class ModelExportConfig:
+    onnx_model_file_path = os.path.join('artifacts', 'model.onnx')
+    target_opset = 17
+    intra_op_threads = INTRA_OP_THREADS
+    min_label_agreement = 0.99
+    max_mean_proba_diff = 1e-3
+
+
+def _register_xgboost_converter():
+    # skl2onnx does not know XGBoost; borrow the converter from onnxmltools
+    from xgboost import XGBClassifier
+    from onnxmltools.convert.xgboost.operator_converters.XGBoost import convert_xgboost
+
+    update_registered_converter(
+        XGBClassifier, "XGBoostXGBClassifier",
+        calculate_linear_classifier_output_shapes, convert_xgboost,
+        options={"nocl": [True, False], "zipmap": [True, False, "columns"]},
+    )
+
+
+class ModelExporter:
+    def __init__(self):
+        self.model_export_config = ModelExportConfig()
+
+    def export(self, preprocessor, model):
+        """
+        Convert the fitted preprocessor + model into a single ONNX graph and
+        return its serialized bytes. Inputs are one float column per feature;
+        the first output is the label, the second the class probabilities.
+        """
+        try:
+            if onnx is None:
+                raise ImportError("skl2onnx/onnx not installed; install them to export ONNX models.")
+
+            columns = list(preprocessor.feature_names_in_)
+            initial_types = [(c, FloatTensorType([None, 1])) for c in columns]
+
+            if type(model).__name__ == "CatBoostClassifier":
+                # CatBoost exports its own ONNX graph; splice it after the preprocessor
+                import tempfile
+                with tempfile.TemporaryDirectory() as tmp:
+                    path = os.path.join(tmp, "catboost.onnx")
+                    model.save_model(path, format="onnx")
+                    cat_graph = onnx.load(path)
+                pre_graph = convert_sklearn(preprocessor, initial_types=initial_types,
+                                            target_opset=self.model_export_config.target_opset)
+                # both halves must agree on the opset of every shared domain
+                # (the ops used here are unchanged between those versions)
+                versions = {}
+                for op in list(pre_graph.opset_import) + list(cat_graph.opset_import):
+                    versions[op.domain] = max(versions.get(op.domain, 0), op.version)
+                for op in list(pre_graph.opset_import) + list(cat_graph.opset_import):
+                    op.version = versions[op.domain]
+                cat_graph.ir_version = pre_graph.ir_version
+                graph = onnx.compose.merge_models(
+                    pre_graph, cat_graph,
+                    io_map=[(pre_graph.graph.output[0].name, cat_graph.graph.input[0].name)],
+                )
+            else:
+                if type(model).__name__ == "XGBClassifier":
+                    _register_xgboost_converter()
+                pipeline = Pipeline([("preprocessor", preprocessor), ("model", model)])
+                graph = convert_sklearn(
+                    pipeline, initial_types=initial_types,
+                    target_opset={"": self.model_export_config.target_opset, "ai.onnx.ml": 3},
+                    options={id(model): {"zipmap": False}},
+                )
+
+            model_bytes = graph.SerializeToString()
+            logging.info(f"Exported {type(model).__name__} pipeline to ONNX ({len(model_bytes)} bytes)")
+            return model_bytes
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def parity_check(self, model_bytes, preprocessor, model, df: pd.DataFrame):
+        """Compare ONNX predictions with the pickle path on the same rows."""
+        try:
+            session = make_session(model_bytes, self.model_export_config.intra_op_threads)
+            label, proba = run_onnx(session, df)
+            X = preprocessor.transform(df)
+            expected = np.asarray(model.predict(X)).ravel()
+            proba_diff = np.abs(proba - model.predict_proba(X))
+
+            # float32 inference can flip a borderline tree split, so judge
+            # parity on label agreement and the mean probability gap
+            label_agreement = float(np.mean(label.astype(int) == expected.astype(int)))
+            mean_proba_diff = float(proba_diff.mean())
+            return {
+                "label_agreement": label_agreement,
+                "mean_proba_diff": mean_proba_diff,
+                "max_proba_diff": float(proba_diff.max()),
+                "passed": label_agreement >= self.model_export_config.min_label_agreement
+                and mean_proba_diff <= self.model_export_config.max_mean_proba_diff,
+            }
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def benchmark(self, model_bytes, preprocessor, model, df: pd.DataFrame, repeats=200):
+        """Single-row latency and batch throughput, pickle path vs onnxruntime."""
+        try:
+            session = make_session(model_bytes, self.model_export_config.intra_op_threads)
+            row = df.iloc[:1]
+
+            def timed(fn, n):
+                fn()  # warm up
+                start = time.perf_counter()
+                for _ in range(n):
+                    fn()
+                return (time.perf_counter() - start) / n
+
+            results = {}
+            for name, single, batch in [
+                ("pickle",
+                 lambda: model.predict(preprocessor.transform(row)),
+                 lambda: model.predict(preprocessor.transform(df))),
+                ("onnx",
+                 lambda: run_onnx(session, row),
+                 lambda: run_onnx(session, df)),
+            ]:
+                batch_s = timed(batch, max(1, repeats // 10))
+                results[name] = {
+                    "single_row_ms": timed(single, repeats) * 1000,
+                    "batch_rows_per_s": len(df) / batch_s,
+                }
+            return results
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def initiate_model_export(self, preprocessor_path, model_path, test_path):
+        """
+        Export step run after ModelTrainer: convert the trained preprocessor +
+        model to ONNX, check it against the pickle path on the test split and
+        publish it with the current run only if the check passes.
+        """
+        try:
+            preprocessor = load_object(preprocessor_path)
+            model = load_object(model_path)
+            test_df = pd.read_csv(test_path).drop(columns=['target'])
+
+            model_bytes = self.export(preprocessor, model)
+            parity = self.parity_check(model_bytes, preprocessor, model, test_df)
+            benchmark = self.benchmark(model_bytes, preprocessor, model, test_df)
+            logging.info(f"ONNX parity: {parity}")
+            logging.info(f"ONNX vs pickle latency: {benchmark}")
+
+            if not parity["passed"]:
+                logging.warning("ONNX export does not match the pickle model; not publishing it")
+                # don't leave a previous run's graph behind next to this run's pickles
+                if os.path.exists(self.model_export_config.onnx_model_file_path):
+                    os.remove(self.model_export_config.onnx_model_file_path)
+                return None
+
+            atomic_write_bytes(self.model_export_config.onnx_model_file_path, model_bytes)
+            store = ArtifactStore()
+            if store.load_manifest() is not None:
+                store.update_run(
+                    artifacts={"model_onnx": model_bytes},
+                    # the ONNX backend has no sklearn preprocessor to read these from
+                    metadata={
+                        "onnx_parity": parity,
+                        "onnx_benchmark": benchmark,
+                        "feature_spreads": feature_spreads(preprocessor),
+                    },
+                )
+            return self.model_export_config.onnx_model_file_path
+
+        except Exception as e:
+            raise CustomException(e, sys)
@@ -21,15 +21,45 @@ from catboost import CatBoostClassifier
 
 from src.mlproject.logger import logging
 from src.mlproject.exception import CustomException
-from src.mlproject.utils import save_object, evaluate_model
+from src.mlproject.utils import save_object, load_object, evaluate_model
+from src.mlproject.artifact_store import ArtifactStore
+from src.mlproject.components.experiment_tracking import AsyncMlflowLogger
+
+SERVING_METRICS = ("single_p50_ms", "single_p99_ms", "batch_ms_per_row", "size_bytes")
+
 
 @dataclass
 class ModelTrainerConfig:
     trained_model_file_path = os.path.join('artifacts', 'model.pkl')
+    # accuracy: highest test accuracy (the original behaviour)
+    # latency_budget: highest accuracy among models whose single-row p99 fits the budget
+    # pareto: fastest model on the accuracy / p99 Pareto front within accuracy_tolerance of the best
+    selection_policy = os.getenv("MODEL_SELECTION_POLICY", "accuracy")
+    latency_budget_ms = float(os.getenv("MODEL_LATENCY_BUDGET_MS", "5.0"))
+    accuracy_tolerance = float(os.getenv("MODEL_ACCURACY_TOLERANCE", "0.005"))
+    # seconds to wait for MLflow to create the model-selection run (the rest of the logging stays async)
+    mlflow_run_timeout = float(os.getenv("MLFLOW_RUN_TIMEOUT", "30"))
+
+
+def pareto_front(model_details):
+    """Models not beaten on both test accuracy and single-row p99 by another model."""
+    front = []
+    for name, d in model_details.items():
+        dominated = any(
+            o["test_accuracy"] >= d["test_accuracy"] and o["single_p99_ms"] <= d["single_p99_ms"]
+            and (o["test_accuracy"] > d["test_accuracy"] or o["single_p99_ms"] < d["single_p99_ms"])
+            for other, o in model_details.items() if other != name
+        )
+        if not dominated:
+            front.append(name)
+    return sorted(front, key=lambda n: model_details[n]["single_p99_ms"])
+
 
 class ModelTrainer:
     def __init__(self):
         self.model_trainer_config = ModelTrainerConfig()
+        # MLflow id of the model-selection run, once log_candidates has run
+        self.parent_run_id = None
 
     def eval_metrics(self, actual, pred):
         acc = accuracy_score(actual, pred)
@@ -38,7 +68,97 @@ class ModelTrainer:
         f1 = f1_score(actual, pred)
         return acc, prec, rec, f1
 
-    def initiate_model_trainer(self, train_array, test_array):
+    def select_model(self, model_report, model_details):
+        """
+        Pick the model to ship according to selection_policy; returns its name
+        and a summary of the trade-off for the run manifest.
+        """
+        config = self.model_trainer_config
+        policy = config.selection_policy
+        best_score = max(model_report.values())
+        # first model with the top accuracy, as before
+        most_accurate = list(model_report.keys())[list(model_report.values()).index(best_score)]
+        front = pareto_front(model_details)
+
+        if policy == "accuracy":
+            chosen = most_accurate
+        elif policy == "latency_budget":
+            within = [n for n in model_report if model_details[n]["single_p99_ms"] <= config.latency_budget_ms]
+            if within:
+                chosen = max(within, key=model_report.get)
+            else:
+                chosen = min(model_report, key=lambda n: model_details[n]["single_p99_ms"])
+                logging.warning(
+                    f"No model meets the {config.latency_budget_ms} ms p99 budget; using the fastest, {chosen}"
+                )
+        elif policy == "pareto":
+            chosen = next(n for n in front if model_report[n] >= best_score - config.accuracy_tolerance)
+        else:
+            raise ValueError(f"Unknown MODEL_SELECTION_POLICY: {policy}")
+
+        selection = {
+            "policy": policy,
+            "latency_budget_ms": config.latency_budget_ms,
+            "accuracy_tolerance": config.accuracy_tolerance,
+            "chosen": chosen,
+            "most_accurate": most_accurate,
+            "accuracy_given_up": float(best_score - model_report[chosen]),
+            "pareto_front": front,
+            "candidates": {
+                name: {
+                    "accuracy": float(model_report[name]),
+                    **{k: model_details[name][k] for k in SERVING_METRICS},
+                }
+                for name in model_report
+            },
+        }
+        logging.info(
+            f"Selection policy {policy}: {chosen} "
+            f"(p99 {model_details[chosen]['single_p99_ms']:.3f} ms, "
+            f"most accurate {most_accurate} p99 {model_details[most_accurate]['single_p99_ms']:.3f} ms)"
+        )
+        return chosen, selection
+
+    def log_candidates(self, model_details, best_model_name, best_metrics):
+        """
+        One parent run for the model selection with a nested run per
+        candidate (best params, CV score of every grid point, fit / predict
+        timing, serving latency and size). Everything goes through AsyncMlflowLogger, so it is sent as a
+        few log_batch calls from a background thread.
+        """
+        tracker = AsyncMlflowLogger()
+        parent = tracker.start_run("model-selection")
+        tracker.log(
+            parent,
+            metrics=best_metrics,
+            params={f"best.{k}": v for k, v in model_details[best_model_name]["best_params"].items()},
+            tags={"best_model": best_model_name, "selection_policy": self.model_trainer_config.selection_policy},
+        )
+        for name, detail in model_details.items():
+            child = tracker.start_run(name, parent=parent, tags={"model": name})
+            tracker.log(
+                child,
+                params=detail["best_params"],
+                metrics={
+                    k: detail[k] for k in (
+                        "test_accuracy", "train_accuracy", "search_time",
+                        "fit_time", "predict_time", "predict_ms_per_row",
+                    ) + SERVING_METRICS
+                },
+            )
+            # one metric point per grid candidate; the step is its index in the grid
+            for step, result in enumerate(detail["cv_results"]):
+                tracker.log(child, metrics={"cv_mean_test_score": result["mean_test_score"]}, step=step)
+            tracker.log(child, tags={
+                f"cv.candidate.{step}": result["params"] for step, result in enumerate(detail["cv_results"])
+            })
+            tracker.end_run(child)
+        tracker.end_run(parent)
+        # don't wait for the flush; only for the parent run's id, which later stages log to
+        tracker.close()
+        self.parent_run_id = tracker.run_id(parent, timeout=self.model_trainer_config.mlflow_run_timeout)
+
+    def initiate_model_trainer(self, train_array, test_array, preprocessor_path=None):
         try:
             logging.info("Splitting training and testing input data")
             X_train, y_train, X_test, y_test = (
@@ -87,23 +207,14 @@ class ModelTrainer:
                 "Logistic Regression": {}
             }
 
-            model_report: dict = evaluate_model(X_train, y_train, X_test, y_test, models, params)
-            best_model_score = max(sorted(model_report.values()))
-            # best_model_name = max(sorted(model_report), key=model_report.get)
-            best_model_name = list(model_report.keys())[list(model_report.values()).index(best_model_score)]
+            model_details = {}
+            model_report: dict = evaluate_model(X_train, y_train, X_test, y_test, models, params, details=model_details)
+            best_model_name, selection = self.select_model(model_report, model_details)
+            best_model_score = model_report[best_model_name]
             best_model = models[best_model_name]
             
             print("This is the best model name", best_model_name)
             
-            model_names = list(params.keys())
-            actual_model = ""
-            
-            for model in model_names:
-                if best_model_name == model:
-                    actual_model = actual_model + model
-                    
-            best_param = params[actual_model]
-
             # MLflow tracking setup (fallback to local file store if remote auth isn't configured)
             tracking_uri_env = os.getenv("MLFLOW_TRACKING_URI")
             if tracking_uri_env:
@@ -116,19 +227,24 @@ class ModelTrainer:
             tracking_url_type_store = urlparse(mlflow.get_tracking_uri()).scheme
 
             try:
-                with mlflow.start_run():
-                    predicted = best_model.predict(X_test)
-
-                    acc, prec, rec, f1 = self.eval_metrics(y_test, predicted)
+                predicted = best_model.predict(X_test)
+                acc, prec, rec, f1 = self.eval_metrics(y_test, predicted)
+                self.log_candidates(
+                    model_details, best_model_name,
+                    {"accuracy": acc, "precision": prec, "recall": rec, "f1_score": f1},
+                )
 
-                    mlflow.log_params(best_param)
-                    mlflow.log_metric("accuracy", acc)
-                    mlflow.log_metric("precision", prec)
-                    mlflow.log_metric("recall", rec)
-                    mlflow.log_metric("f1_score", f1)
-
-                    if tracking_url_type_store != "file":
+                if tracking_url_type_store != "file" and self.parent_run_id is None:
+                    # start_run(run_id=None) would create an unrelated run for the model
+                    logging.warning("MLflow model-selection run was not created in time; not logging the model")
+                elif tracking_url_type_store != "file":
+                    # reopen the finished parent run just to attach the model;
+                    # a failed upload must not mark the selection run FAILED
+                    mlflow.start_run(run_id=self.parent_run_id)
+                    try:
                         mlflow.sklearn.log_model(best_model, "model")
+                    finally:
+                        mlflow.end_run()
             except Exception as mlfe:
                 logging.warning(f"MLflow logging skipped due to: {mlfe}")
 
@@ -141,6 +257,21 @@ class ModelTrainer:
                 obj=best_model
             )
 
+            # publish preprocessor + model of this run together so serving
+            # never pairs a new model with an old preprocessor
+            if preprocessor_path is not None:
+                ArtifactStore().commit_run(
+                    artifacts={
+                        "preprocessor": load_object(preprocessor_path),
+                        "model": best_model,
+                    },
+                    metadata={
+                        "model_name": best_model_name,
+                        "accuracy": float(best_model_score),
+                        "selection": selection,
+                    },
+                )
+
             return accuracy_score(y_test, best_model.predict(X_test))
 
         except Exception as e:
@@ -0,0 +1,227 @@
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+from src.mlproject.exception import CustomException
+from src.mlproject.logger import logging
+from src.mlproject.artifact_store import ArtifactStore
+from src.mlproject.features import FEATURE_COLUMNS
+from src.mlproject.utils import load_object
+
+
+@dataclass
+class SimilarityIndexConfig:
+    # rows per KD-tree shard; new rows are buffered and brute-force searched
+    # until a full shard can be sealed into a tree
+    shard_size: int = int(os.getenv("SIMILARITY_SHARD_SIZE", "250000"))
+    # the index holds a uniform reservoir sample of at most this many distinct
+    # training rows, so its memory does not grow with the training history
+    max_rows: int = int(os.getenv("SIMILARITY_MAX_ROWS", "1000000"))
+    leaf_size: int = 40
+    chunk_size: int = 100_000
+    random_state: int = 42
+
+
+class _Scaler:
+    """
+    The preprocessor's median-impute + standard-scale step as plain numpy, so
+    a one-row query doesn't pay ColumnTransformer overhead. Falls back to the
+    preprocessor itself if it isn't that shape.
+    """
+
+    def __init__(self, preprocessor):
+        self.preprocessor = preprocessor
+        self.fill = self.mean = self.scale = None
+        try:
+            num_pipeline = preprocessor.named_transformers_["num_pipeline"]
+            columns = [c for name, _, cols in preprocessor.transformers_ if name == "num_pipeline" for c in cols]
+            if columns == FEATURE_COLUMNS:
+                self.fill = num_pipeline.named_steps["imputer"].statistics_
+                self.mean = num_pipeline.named_steps["scaler"].mean_
+                self.scale = num_pipeline.named_steps["scaler"].scale_
+        except Exception:
+            pass
+
+    def transform(self, df: pd.DataFrame) -> np.ndarray:
+        if self.mean is None:
+            return np.asarray(self.preprocessor.transform(df), dtype=np.float32)
+        return self.transform_array(df[FEATURE_COLUMNS].to_numpy(dtype=np.float64))
+
+    def transform_array(self, x: np.ndarray) -> np.ndarray:
+        if self.mean is None:
+            return self.transform(pd.DataFrame(x, columns=FEATURE_COLUMNS))
+        x = np.where(np.isnan(x), self.fill, x)
+        return ((x - self.mean) / self.scale).astype(np.float32)
+
+
+class _Reservoir:
+    """
+    Uniform sample of at most `size` rows from a stream of chunks (Algorithm R,
+    vectorized per chunk): memory stays at `size` rows however long the stream.
+    """
+
+    def __init__(self, size, random_state=None):
+        self.size = size
+        self.rng = np.random.default_rng(random_state)
+        self.seen = 0
+        # grows while filling, so a small training set doesn't allocate `size` rows
+        self.rows = np.empty((0, len(FEATURE_COLUMNS)), dtype=np.float64)
+        self.outcomes = np.empty(0, dtype=np.int8)
+
+    def add(self, rows: np.ndarray, outcomes: np.ndarray):
+        n = len(outcomes)
+        fill = min(max(self.size - self.seen, 0), n)
+        if fill:
+            self.rows = np.concatenate([self.rows, rows[:fill]])
+            self.outcomes = np.concatenate([self.outcomes, outcomes[:fill]])
+
+        # row t of the stream (t >= size) replaces slot j ~ U[0, t] if j < size
+        positions = np.arange(self.seen + fill, self.seen + n)
+        slots = self.rng.integers(0, positions + 1) if len(positions) else positions
+        keep = slots < self.size
+        src, slots = np.flatnonzero(keep) + fill, slots[keep]
+        # when one chunk hits the same slot twice the later row wins, as in the sequential algorithm
+        last = len(slots) - 1 - np.unique(slots[::-1], return_index=True)[1]
+        self.rows[slots[last]] = rows[src[last]]
+        self.outcomes[slots[last]] = outcomes[src[last]]
+        self.seen += n
+
+    def sample(self):
+        return self.rows, self.outcomes
+
+
+class SimilarityIndex:
+    """
+    Nearest-neighbour index over scaled patient rows: a list of sealed
+    KD-tree shards plus an append buffer. Adding rows never rebuilds an
+    existing tree, and every shard is a fixed size, so building and querying
+    stay bounded; SimilarityIndexBuilder caps the total at `max_rows`. Raw
+    feature rows and outcomes are kept alongside (float32 / int8) for the
+    response.
+    """
+
+    def __init__(self, preprocessor, config: SimilarityIndexConfig = None):
+        self.config = config or SimilarityIndexConfig()
+        self.scaler = _Scaler(preprocessor)
+        self.shards = []     # [(KDTree, raw rows, outcomes)]
+        self._buffer = None  # (scaled rows, raw rows, outcomes) not yet in a tree
+
+    def __len__(self):
+        buffered = len(self._buffer[2]) if self._buffer else 0
+        return sum(len(outcomes) for _, _, outcomes in self.shards) + buffered
+
+    def add(self, df: pd.DataFrame, outcomes):
+        part = (
+            self.scaler.transform(df),
+            df[FEATURE_COLUMNS].to_numpy(dtype=np.float32),
+            np.asarray(outcomes, dtype=np.int8),
+        )
+        self._buffer = part if self._buffer is None else tuple(
+            np.concatenate(pair) for pair in zip(self._buffer, part)
+        )
+        while self._buffer is not None and len(self._buffer[2]) >= self.config.shard_size:
+            self._seal(self.config.shard_size)
+
+    def flush(self):
+        """Seal whatever is buffered into a (smaller) tree shard."""
+        if self._buffer is not None:
+            self._seal(len(self._buffer[2]))
+
+    def _seal(self, n):
+        scaled, raw, outcomes = self._buffer
+        tree = KDTree(scaled[:n], leaf_size=self.config.leaf_size)
+        self.shards.append((tree, raw[:n], outcomes[:n]))
+        self._buffer = (scaled[n:], raw[n:], outcomes[n:]) if len(outcomes) > n else None
+
+    def query(self, row: dict, k: int = 5):
+        """k nearest historical rows to one encoded feature row, closest first."""
+        x = self.scaler.transform_array(np.array([[row[c] for c in FEATURE_COLUMNS]], dtype=np.float64))
+        candidates = []  # (distances, raw rows, outcomes)
+
+        for tree, raw, outcomes in self.shards:
+            dist, idx = tree.query(x, k=min(k, len(outcomes)))
+            candidates.append((dist[0], raw[idx[0]], outcomes[idx[0]]))
+
+        if self._buffer is not None:
+            scaled, raw, outcomes = self._buffer
+            dist = np.sqrt(((scaled - x) ** 2).sum(axis=1))
+            top = np.argsort(dist)[:k]
+            candidates.append((dist[top], raw[top], outcomes[top]))
+
+        if not candidates:
+            return []
+        dist, raw, outcomes = (np.concatenate(parts) for parts in zip(*candidates))
+        order = np.argsort(dist)[:k]
+        return [
+            {
+                "distance": float(dist[i]),
+                "outcome": int(outcomes[i]),
+                "features": dict(zip(FEATURE_COLUMNS, (round(v, 4) for v in raw[i].tolist()))),
+            }
+            for i in order
+        ]
+
+
+class SimilarityIndexBuilder:
+    def __init__(self):
+        self.similarity_index_config = SimilarityIndexConfig()
+
+    def initiate_similarity_index(self, train_path, preprocessor_path, publish=True):
+        """
+        Build the index over a bounded reservoir sample of the training split
+        (read in chunks, so this also works for streaming runs), without
+        duplicate rows, and publish it with the current artifact run. With
+        publish=False the caller publishes it (the streaming pipeline commits
+        the whole run at the end).
+        """
+        try:
+            config = self.similarity_index_config
+            reservoir = _Reservoir(config.max_rows, config.random_state)
+            for chunk in pd.read_csv(train_path, chunksize=config.chunk_size):
+                reservoir.add(chunk[FEATURE_COLUMNS].to_numpy(dtype=np.float64), chunk['target'].to_numpy(dtype=np.int8))
+
+            # identical patients would otherwise fill the k results with copies of one row
+            rows, outcomes = reservoir.sample()
+            sample = pd.DataFrame(rows, columns=FEATURE_COLUMNS)
+            sample['target'] = outcomes
+            sample = sample.drop_duplicates(ignore_index=True)
+
+            index = SimilarityIndex(load_object(preprocessor_path), config)
+            for start in range(0, len(sample), config.chunk_size):
+                part = sample.iloc[start:start + config.chunk_size]
+                index.add(part[FEATURE_COLUMNS], part['target'].to_numpy())
+            index.flush()
+            logging.info(f"Built similarity index over {len(index)} distinct rows sampled from {reservoir.seen} training rows")
+
+            store = ArtifactStore()
+            if publish and store.load_manifest() is not None:
+                store.update_run(artifacts={"similarity_index": index})
+            return index
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+_index = None
+_index_loaded = False
+
+
+def get_similarity_index():
+    """
+    Index published with the current run (memory-mapped), or None. Both
+    outcomes are cached for the life of the process, like the predict
+    pipeline, so a deployment without an index doesn't re-read the manifest
+    on every request.
+    """
+    global _index, _index_loaded
+    if not _index_loaded:
+        store = ArtifactStore()
+        manifest = store.load_manifest()
+        if manifest is not None and "similarity_index" in manifest["artifacts"]:
+            _index = store.get(manifest["artifacts"]["similarity_index"])
+        _index_loaded = True
+    return _index
@@ -0,0 +1,223 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from src.mlproject.exception import CustomException
+from src.mlproject.logger import logging
+from src.mlproject.artifact_store import atomic_write_json
+
+# Avoid importing optional DB / columnar libraries at module import
+try:
+    import pymysql
+    import pymysql.cursors
+except Exception:
+    pymysql = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    pa = None
+
+load_dotenv()
+
+
+@dataclass
+class SqlIngestionConfig:
+    table: str = os.getenv("SQL_TABLE", "heart")
+    # monotonically increasing column (auto-increment id, updated_at, ...);
+    # empty means every run pulls the full table
+    watermark_column: str = os.getenv("SQL_WATERMARK_COLUMN", "")
+    chunksize: int = int(os.getenv("SQL_CHUNKSIZE", "50000"))
+    parts_dir: str = os.path.join('artifact', 'sql_parts')
+    state_file_path: str = os.path.join('artifact', 'sql_ingestion_state.json')
+    # set to a file path to read from SQLite instead of MySQL (local testing)
+    sqlite_path: str = os.getenv("SQLITE_PATH", "")
+
+
+_connection = None
+_connection_lock = threading.Lock()
+
+
+def get_connection(config: SqlIngestionConfig):
+    """
+    One connection per process, reused across ingestion runs; a MySQL
+    connection that has gone away is re-established by ping(reconnect=True).
+    """
+    global _connection
+    with _connection_lock:
+        if config.sqlite_path:
+            if _connection is None:
+                _connection = sqlite3.connect(config.sqlite_path, check_same_thread=False)
+            return _connection
+
+        if pymysql is None:
+            raise ImportError("pymysql not installed; install it or use CSV ingestion.")
+        if _connection is None:
+            _connection = pymysql.connect(
+                host=os.getenv("host"),
+                user=os.getenv("user"),
+                password=os.getenv("password"),
+                db=os.getenv("db"),
+            )
+            logging.info(f"Connection Established: {_connection}")
+        else:
+            _connection.ping(reconnect=True)
+        return _connection
+
+
+def _identifier(name):
+    if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", name):
+        raise ValueError(f"Invalid SQL identifier: {name!r}")
+    return name
+
+
+class SqlIngestion:
+    def __init__(self, config: SqlIngestionConfig = None):
+        self.sql_ingestion_config = config or SqlIngestionConfig()
+
+    def _load_state(self):
+        path = self.sql_ingestion_config.state_file_path
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def pull(self):
+        """
+        Stream new rows (watermark > last stored value) from the table into a
+        new part file under parts_dir, chunk by chunk through a server-side
+        cursor. Returns a small report with row count and timing.
+        """
+        try:
+            config = self.sql_ingestion_config
+            start = time.perf_counter()
+            table = _identifier(config.table)
+            watermark = _identifier(config.watermark_column) if config.watermark_column else None
+            state = self._load_state()
+            last = state.get("watermark") if watermark else None
+
+            connection = get_connection(config)
+            sqlite = isinstance(connection, sqlite3.Connection)
+            placeholder = "?" if sqlite else "%s"
+            query = f"SELECT * FROM {table}"
+            params = ()
+            if watermark:
+                if last is not None:
+                    query += f" WHERE {watermark} > {placeholder}"
+                    params = (last,)
+                query += f" ORDER BY {watermark}"
+
+            # SSCursor streams rows from the server instead of buffering the result
+            cursor = connection.cursor() if sqlite else connection.cursor(pymysql.cursors.SSCursor)
+            os.makedirs(config.parts_dir, exist_ok=True)
+            stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+            suffix = "parquet" if pa is not None else "csv"
+            part_path = os.path.join(config.parts_dir, f"part-{stamp}.{suffix}")
+            tmp_path = part_path + ".tmp"
+
+            rows, writer, new_watermark = 0, None, last
+            try:
+                cursor.execute(query, params)
+                columns = [d[0] for d in cursor.description]
+                while True:
+                    batch = cursor.fetchmany(config.chunksize)
+                    if not batch:
+                        break
+                    frame = pd.DataFrame(batch, columns=columns)
+                    # columnar parquet when pyarrow is available, CSV otherwise
+                    if pa is not None:
+                        table_chunk = pa.Table.from_pandas(frame, preserve_index=False)
+                        if writer is None:
+                            writer = pq.ParquetWriter(tmp_path, table_chunk.schema)
+                        writer.write_table(table_chunk.cast(writer.schema))
+                    else:
+                        frame.to_csv(tmp_path, mode='a', index=False, header=rows == 0)
+                    rows += len(frame)
+                    if watermark:
+                        new_watermark = frame[watermark].max()
+            except BaseException:
+                if writer is not None:
+                    writer.close()
+                    writer = None
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            finally:
+                cursor.close()
+                if writer is not None:
+                    writer.close()
+
+            if rows:
+                os.replace(tmp_path, part_path)
+                if not watermark:
+                    # a full pull supersedes every earlier part
+                    for name in os.listdir(config.parts_dir):
+                        path = os.path.join(config.parts_dir, name)
+                        if name.startswith("part-") and path != part_path:
+                            os.remove(path)
+            if watermark and new_watermark is not None:
+                state["watermark"] = new_watermark.item() if hasattr(new_watermark, "item") else new_watermark
+            state["last_run"] = {"rows": rows, "part": part_path if rows else None}
+            atomic_write_json(config.state_file_path, state)
+
+            elapsed = time.perf_counter() - start
+            report = {
+                "rows": rows,
+                "seconds": round(elapsed, 3),
+                "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else None,
+                "watermark": state.get("watermark"),
+            }
+            logging.info(f"SQL ingestion from {table}: {report}")
+            return report
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def _part_paths(self):
+        parts_dir = self.sql_ingestion_config.parts_dir
+        parts = sorted(
+            os.path.join(parts_dir, name) for name in os.listdir(parts_dir)
+            if name.startswith("part-") and not name.endswith(".tmp")
+        ) if os.path.isdir(parts_dir) else []
+        if not parts:
+            raise ValueError(f"No ingested data under {parts_dir}")
+        return parts
+
+    def iter_parts(self, chunksize: int = None, columns: list = None):
+        """
+        Rows pulled so far as a stream of DataFrames of at most chunksize rows
+        (SQL_CHUNKSIZE by default), so a caller can process the table without
+        holding it in memory. `columns` selects (and orders) the columns read,
+        e.g. to leave the watermark column out of the training data.
+        """
+        try:
+            chunksize = chunksize or self.sql_ingestion_config.chunksize
+            for path in self._part_paths():
+                if path.endswith(".parquet"):
+                    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+                        frame = batch.to_pandas()
+                        yield frame if columns is None else frame[columns]
+                else:
+                    for frame in pd.read_csv(path, chunksize=chunksize, usecols=columns):
+                        yield frame if columns is None else frame[columns]
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def read_parts(self, columns: list = None):
+        """All rows pulled so far, read back from the local part files into one DataFrame."""
+        try:
+            return pd.concat(self.iter_parts(columns=columns), ignore_index=True)
+
+        except Exception as e:
+            raise CustomException(e, sys)
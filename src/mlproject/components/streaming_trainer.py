@@ -0,0 +1,109 @@
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import SGDClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.neural_network import MLPClassifier
+
+from src.mlproject.logger import logging
+from src.mlproject.exception import CustomException
+from src.mlproject.utils import save_object
+from src.mlproject.artifact_store import ArtifactStore
+
+
+@dataclass
+class StreamingTrainerConfig:
+    trained_model_file_path = os.path.join('artifacts', 'model.pkl')
+    chunksize = 100_000
+    epochs = int(os.getenv("STREAMING_EPOCHS", "5"))
+    random_state = 42
+
+
+class StreamingModelTrainer:
+    """
+    Out-of-core counterpart of ModelTrainer: every candidate is an
+    incremental learner trained with partial_fit on one chunk at a time, and
+    evaluated by streaming the test file. Peak memory is set by chunksize,
+    not by the number of rows.
+    """
+
+    def __init__(self):
+        self.streaming_trainer_config = StreamingTrainerConfig()
+        # set by initiate_streaming_training, published by publish_run
+        self.best_model = None
+        self.best_model_name = None
+        self.best_model_score = None
+
+    def _chunks(self, path, preprocessor, rng=None):
+        for chunk in pd.read_csv(path, chunksize=self.streaming_trainer_config.chunksize):
+            if rng is not None:
+                # SGD needs shuffled input; shuffle within each chunk
+                chunk = chunk.iloc[rng.permutation(len(chunk))]
+            X = preprocessor.transform(chunk.drop(columns=['target']))
+            yield X, chunk['target'].to_numpy()
+
+    def initiate_streaming_training(self, train_path, test_path, preprocessor):
+        try:
+            config = self.streaming_trainer_config
+            models = {
+                "SGD Logistic Regression": SGDClassifier(loss="log_loss", random_state=config.random_state),
+                "Naive Bayes": GaussianNB(),
+                "MLP": MLPClassifier(hidden_layer_sizes=(32,), random_state=config.random_state),
+            }
+            classes = np.array([0, 1])
+
+            rng = np.random.default_rng(config.random_state)
+            for epoch in range(config.epochs):
+                for X, y in self._chunks(train_path, preprocessor, rng):
+                    for model in models.values():
+                        model.partial_fit(X, y, classes=classes)
+                logging.info(f"Streaming training epoch {epoch + 1}/{config.epochs} done")
+
+            correct = {name: 0 for name in models}
+            total = 0
+            for X, y in self._chunks(test_path, preprocessor):
+                for name, model in models.items():
+                    correct[name] += int((model.predict(X) == y).sum())
+                total += len(y)
+            model_report = {name: correct[name] / total for name in models}
+            logging.info(f"Streaming model report: {model_report}")
+
+            best_model_name = max(model_report, key=model_report.get)
+            best_model_score = model_report[best_model_name]
+            best_model = models[best_model_name]
+            if best_model_score < 0.6:
+                raise ValueError("No best model found")
+
+            logging.info(f"Best model found: {best_model_name} with score: {best_model_score}")
+            # nothing is published yet: see publish_run
+            self.best_model, self.best_model_name, self.best_model_score = best_model, best_model_name, best_model_score
+            return best_model_score
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def publish_run(self, preprocessor, artifacts: dict = None):
+        """
+        Save and publish the trained model with its preprocessor (and any
+        other artifacts of the run, e.g. the similarity index). Called once
+        every streaming stage has succeeded, so a failed run never replaces
+        the manifest that serving reads.
+        """
+        try:
+            if self.best_model is None:
+                raise ValueError("No trained model to publish; run initiate_streaming_training first")
+            save_object(file_path=self.streaming_trainer_config.trained_model_file_path, obj=self.best_model)
+            return ArtifactStore().commit_run(
+                artifacts={"preprocessor": preprocessor, "model": self.best_model, **(artifacts or {})},
+                metadata={
+                    "model_name": self.best_model_name,
+                    "accuracy": float(self.best_model_score),
+                    "training_mode": "streaming",
+                },
+            )
+
+        except Exception as e:
+            raise CustomException(e, sys)
@@ -0,0 +1,136 @@
+# Deterministic, locally rendered answers for the LLM endpoints, served when
+# the upstream model misses the endpoint's latency budget (see
+# LLMClient.complete_within). Every combination of endpoint, risk bucket and
+# profile band is assembled once at import; rendering is a dict lookup plus
+# filling in the patient's own numbers.
+
+from itertools import product
+
+ENDPOINTS = ("diet-plan", "risk-report", "lifestyle", "doctor-note", "chat")
+RISK_BUCKETS = ("low", "moderate", "high", "unknown")
+AGE_BANDS = ("under_45", "45_to_60", "over_60")
+
+NOTICE = (
+    "Note: our AI assistant is busy right now, so this is our standard guidance "
+    "for patients with a similar profile. It is not a substitute for advice from your doctor."
+)
+
+
+def risk_bucket(risk):
+    """Model probability of heart disease -> low / moderate / high (unknown without a prediction)."""
+    if risk is None:
+        return "unknown"
+    if risk < 0.3:
+        return "low"
+    if risk < 0.6:
+        return "moderate"
+    return "high"
+
+
+def profile_band(profile):
+    """(age band, blood pressure high?, cholesterol high?) for a health profile dict."""
+    if not profile:
+        return "45_to_60", False, False
+    age = profile["age"]
+    age_band = "under_45" if age < 45 else "45_to_60" if age <= 60 else "over_60"
+    return age_band, profile["trestbps"] >= 140, profile["chol"] >= 240
+
+
+_RISK_SUMMARY = {
+    "low": "Your predicted risk of heart disease is low.",
+    "moderate": "Your predicted risk of heart disease is moderate.",
+    "high": "Your predicted risk of heart disease is high.",
+    "unknown": "We don't have a risk prediction for you yet.",
+}
+
+_AGE_NOTE = {
+    "under_45": "At your age, habits you build now have the largest long-term effect on heart health.",
+    "45_to_60": "Between 45 and 60, blood pressure and cholesterol tend to rise, so regular checks matter.",
+    "over_60": "After 60, choose gentle, regular activity and review your medicines with your doctor.",
+}
+
+_BP_NOTE = (
+    "Your resting blood pressure ({trestbps} mm Hg) is above 140: keep salt under 5 g a day, "
+    "limit processed and pickled foods, and have it re-checked."
+)
+_CHOL_NOTE = (
+    "Your cholesterol ({chol} mg/dL) is above 240: cut saturated fat (fried food, fatty meat, "
+    "butter, full-fat dairy) and add soluble fibre such as oats, beans and lentils."
+)
+
+_DIET_BY_RISK = {
+    "low": "Keep a balanced, Mediterranean-style diet to stay in the low-risk range.",
+    "moderate": "A Mediterranean-style diet with less salt and saturated fat can lower your risk.",
+    "high": "Follow a strict heart-healthy diet and agree the plan with your doctor or a dietitian.",
+    "unknown": "A Mediterranean-style diet is a good default for heart health.",
+}
+
+_DIET_BODY = (
+    "Eat more: vegetables, fruit, whole grains, legumes, nuts, olive oil and fish twice a week.\n"
+    "Eat less: salt, sugar, red and processed meat, fried food, refined flour and sugary drinks.\n"
+    "Sample day: oats with fruit and nuts for breakfast; lentil or bean salad with whole-grain "
+    "bread for lunch; grilled fish or tofu with vegetables and brown rice for dinner; fruit, "
+    "yoghurt or a handful of nuts as snacks."
+)
+
+_LIFESTYLE_BY_RISK = {
+    "low": "Aim for 150 minutes of moderate exercise a week, such as brisk walking.",
+    "moderate": "Build up to 150 minutes of moderate exercise a week and break up long periods of sitting.",
+    "high": "Ask your doctor before starting new exercise; begin with short, gentle walks.",
+    "unknown": "Aim for 150 minutes of moderate exercise a week, such as brisk walking.",
+}
+
+_LIFESTYLE_BODY = (
+    "Sleep 7-8 hours a night, avoid tobacco, keep alcohol low, and manage stress with "
+    "breathing exercises, time outdoors or talking to someone you trust."
+)
+
+_DOCTOR_BY_RISK = {
+    "low": "Model-estimated risk: low. Routine follow-up and lifestyle counselling suggested.",
+    "moderate": "Model-estimated risk: moderate. Review modifiable risk factors; consider follow-up within 3 months.",
+    "high": "Model-estimated risk: high. Prompt clinical review and further cardiac work-up suggested.",
+    "unknown": "No model risk estimate available.",
+}
+
+_DOCTOR_PROFILE = (
+    "Patient: {age}-year-old {sex}. BP {trestbps} mm Hg, cholesterol {chol} mg/dL, max HR {thalach}, "
+    "ST depression {oldpeak}, exercise angina: {exang}, thalassemia: {thal}, major vessels: {ca}."
+)
+
+
+def _risk_report(bucket, age_band, high_bp, high_chol):
+    factors = [f for f, on in (("blood pressure", high_bp), ("cholesterol", high_chol)) if on]
+    lines = [_RISK_SUMMARY[bucket]]
+    if factors:
+        lines.append(f"Elevated {' and '.join(factors)} contribute to this estimate.")
+    elif bucket in ("moderate", "high"):
+        lines.append("Age, chest pain type, ECG and exercise test results contribute to this estimate.")
+    lines.append(_AGE_NOTE[age_band])
+    return lines
+
+
+def _build(endpoint, bucket, age_band, high_bp, high_chol):
+    risk_notes = ([_BP_NOTE] if high_bp else []) + ([_CHOL_NOTE] if high_chol else [])
+    if endpoint == "diet-plan":
+        lines = [_DIET_BY_RISK[bucket], _DIET_BODY] + risk_notes
+    elif endpoint == "risk-report":
+        lines = _risk_report(bucket, age_band, high_bp, high_chol) + risk_notes
+    elif endpoint == "lifestyle":
+        lines = [_LIFESTYLE_BY_RISK[bucket], _LIFESTYLE_BODY, _AGE_NOTE[age_band]] + risk_notes
+    elif endpoint == "doctor-note":
+        lines = [_DOCTOR_PROFILE, _DOCTOR_BY_RISK[bucket]]
+    else:  # chat
+        lines = [_RISK_SUMMARY[bucket], _DIET_BY_RISK[bucket], _LIFESTYLE_BY_RISK[bucket]] + risk_notes
+    return "\n\n".join(lines + [NOTICE])
+
+
+TEMPLATES = {
+    key: _build(*key)
+    for key in product(ENDPOINTS, RISK_BUCKETS, AGE_BANDS, (False, True), (False, True))
+}
+
+
+def render_fallback(endpoint, profile=None, risk=None):
+    """The templated answer for endpoint, a health profile dict (API labels) and model risk."""
+    text = TEMPLATES[(endpoint, risk_bucket(risk), *profile_band(profile))]
+    return text.format(**profile) if profile else text
@@ -0,0 +1,47 @@
+# Mapping between the UI/API health profile (labels like "Male", "Flat") and
+# the numeric feature columns the preprocessor and model were trained on.
+
+import numpy as np
+import pandas as pd
+
+FEATURE_COLUMNS = ['age', 'sex', 'cp', 'trestbps', 'chol', 'fbs', 'restecg',
+                   'thalach', 'exang', 'oldpeak', 'slope', 'ca', 'thal']
+
+CATEGORIES = {
+    "sex": ["Female", "Male"],
+    "cp": ["Typical Angina", "Atypical Angina", "Non-anginal", "Asymptomatic"],
+    "fbs": ["No", "Yes"],
+    "restecg": ["Normal", "ST-T Abnormality", "Left Ventricular Hypertrophy"],
+    "exang": ["No", "Yes"],
+    "slope": ["Upsloping", "Flat", "Downsloping"],
+    "thal": ["Normal", "Fixed Defect", "Reversible Defect"],
+}
+
+
+def encode_profile(profile: dict) -> dict:
+    """Turn one API health profile into the model's numeric feature row."""
+    return {
+        column: CATEGORIES[column].index(profile[column]) if column in CATEGORIES else profile[column]
+        for column in FEATURE_COLUMNS
+    }
+
+
+def encode_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Vectorized encode_profile for many rows. Columns that already hold the
+    numeric codes are passed through unchanged.
+    """
+    missing = [c for c in FEATURE_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing feature columns: {missing}")
+
+    encoded = {}
+    for column in FEATURE_COLUMNS:
+        values = df[column]
+        if column in CATEGORIES and not pd.api.types.is_numeric_dtype(values):
+            codes = pd.Categorical(values, categories=CATEGORIES[column]).codes
+            if (codes < 0).any():
+                raise ValueError(f"Unknown value in column '{column}'")
+            values = codes
+        encoded[column] = np.asarray(values, dtype=np.float64)
+    return pd.DataFrame(encoded, columns=FEATURE_COLUMNS)
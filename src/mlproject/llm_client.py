@@ -0,0 +1,549 @@
+# Wrapper around the Groq chat completions API used by every LLM endpoint.
+#
+# - Single-flight coalescing: identical prompts that are already in flight
+#   share one upstream call instead of each paying for their own.
+# - Token-bucket rate limiting, per client and globally. The per-client
+#   bucket is charged for every request; the global bucket only for calls
+#   that actually go upstream. With policy "queue" a request waits for a
+#   token (up to max_wait seconds), with "reject" it fails immediately.
+#
+# - Latency SLO mode (complete_within): each endpoint has a latency budget.
+#   When the upstream call is slower than a percentile of that endpoint's
+#   recent latencies, one hedged duplicate is sent and the first answer
+#   wins; when the budget runs out the caller gets its fallback (a local
+#   template) instead of waiting. Waiting for a rate-limit token counts
+#   against the budget, and upstream calls run on a bounded thread pool, so
+#   a request thread only ever waits up to its budget.
+#
+# Run `python -m src.mlproject.llm_client` to simulate bursts against a fake
+# upstream and see how the limiter, coalescing and hedging behave.
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+import numpy as np
+
+
+@dataclass
+class LLMClientConfig:
+    model: str = os.getenv("LLM_MODEL", "openai/gpt-oss-120b")
+    global_rate: float = float(os.getenv("LLM_GLOBAL_RPS", "5"))
+    global_burst: int = int(os.getenv("LLM_GLOBAL_BURST", "10"))
+    client_rate: float = float(os.getenv("LLM_CLIENT_RPS", "0.5"))
+    client_burst: int = int(os.getenv("LLM_CLIENT_BURST", "5"))
+    policy: str = os.getenv("LLM_LIMIT_POLICY", "queue")  # "queue" or "reject"
+    max_wait: float = float(os.getenv("LLM_MAX_WAIT", "10"))
+    max_tracked_clients: int = int(os.getenv("LLM_MAX_CLIENTS", "10000"))
+    # serving processes sharing the global limit (gunicorn.conf.py exports WEB_CONCURRENCY)
+    processes: int = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+
+def _parse_budgets(spec: str) -> dict:
+    # "diet-plan=12,chat=6" -> {"diet-plan": 12.0, "chat": 6.0}
+    return {k.strip(): float(v) for k, v in (item.split("=") for item in spec.split(",") if item.strip())}
+
+
+@dataclass
+class SLOConfig:
+    enabled: bool = os.getenv("LLM_SLO_MODE", "1") == "1"
+    # seconds per endpoint (LLM_SLO_BUDGETS="diet-plan=12,chat=6"), default for the rest
+    default_budget: float = float(os.getenv("LLM_SLO_BUDGET", "8"))
+    budgets: dict = field(default_factory=lambda: _parse_budgets(os.getenv("LLM_SLO_BUDGETS", "diet-plan=12")))
+    # hedge once the call is slower than this percentile of recent upstream latencies
+    hedge_percentile: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "90"))
+    hedge_min_delay: float = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+    # until an endpoint has min_samples latencies, hedge at this fraction of its budget
+    hedge_default_fraction: float = 0.5
+    min_samples: int = 20
+    window: int = 200
+    upstream_threads: int = int(os.getenv("LLM_UPSTREAM_THREADS", "32"))
+
+    def budget(self, endpoint) -> float:
+        return self.budgets.get(endpoint, self.default_budget)
+
+
+class LatencyWindow:
+    """The last `size` latencies of one endpoint."""
+
+    def __init__(self, size):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, q, min_samples=1):
+        with self.lock:
+            if len(self.samples) < min_samples:
+                return None
+            return float(np.percentile(self.samples, q))
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"{scope} rate limit exceeded, retry after {retry_after:.1f}s")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, max_wait: float) -> float:
+        """
+        Take one token and return how long the caller must wait before using
+        it. Raises RateLimitExceeded (and takes nothing) if that is longer
+        than max_wait.
+        """
+        with self.lock:
+            self._refill()
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            if wait > max_wait:
+                raise RateLimitExceeded("", wait)
+            self.tokens -= 1
+            return wait
+
+
+class RateLimiter:
+    def __init__(self, config: LLMClientConfig, clock=time.monotonic):
+        self.config = config
+        self.clock = clock
+        # every worker process has its own buckets: split the global limit
+        # between them so the service as a whole stays within LLM_GLOBAL_RPS.
+        # Client buckets are per process (a client spread over n workers gets up to n x).
+        processes = max(1, config.processes)
+        self.global_bucket = TokenBucket(
+            config.global_rate / processes, max(1.0, config.global_burst / processes), clock
+        )
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _max_wait(self):
+        return self.config.max_wait if self.config.policy == "queue" else 0.0
+
+    def _client_bucket(self, client_id):
+        with self._lock:
+            bucket = self._clients.get(client_id)
+            if bucket is None:
+                bucket = TokenBucket(self.config.client_rate, self.config.client_burst, self.clock)
+                self._clients[client_id] = bucket
+                if len(self._clients) > self.config.max_tracked_clients:
+                    self._clients.popitem(last=False)
+            else:
+                self._clients.move_to_end(client_id)
+            return bucket
+
+    def acquire(self, bucket: TokenBucket, scope: str, max_wait: float = None):
+        # max_wait can only shorten the configured wait (e.g. to a latency budget)
+        max_wait = self._max_wait() if max_wait is None else min(max_wait, self._max_wait())
+        try:
+            wait = bucket.reserve(max_wait)
+        except RateLimitExceeded as e:
+            raise RateLimitExceeded(scope, e.retry_after)
+        if wait > 0:
+            time.sleep(wait)
+
+    def acquire_client(self, client_id, max_wait: float = None):
+        if client_id is not None:
+            self.acquire(self._client_bucket(client_id), "client", max_wait)
+
+    def acquire_global(self):
+        self.acquire(self.global_bucket, "global")
+
+    def try_acquire_global(self) -> bool:
+        """Take a global token only if one is available right now."""
+        try:
+            self.global_bucket.reserve(0.0)
+            return True
+        except RateLimitExceeded:
+            return False
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Run fn() once per key at a time; concurrent callers get the same result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class _HedgedCall:
+    # one in-flight prompt in SLO mode: the primary upstream call and, once
+    # it is slow, a single hedge; coalesced requests wait on the same futures
+    def __init__(self, primary):
+        self.futures = [primary]
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        # requests waiting on this call (guarded by LLMClient._stats_lock)
+        self.waiters = 1
+
+
+ENDPOINT_COUNTERS = (
+    "requests", "coalesced", "hedged", "hedge_wins", "fallback_timeout", "fallback_error", "fallback_rate_limited",
+)
+
+
+class LLMClient:
+    def __init__(self, groq_client, config: LLMClientConfig = None, slo: SLOConfig = None):
+        self.client = groq_client
+        self.config = config or LLMClientConfig()
+        self.slo = slo or SLOConfig()
+        self.limiter = RateLimiter(self.config)
+        self.flight = SingleFlight()
+        self.stats = {"requests": 0, "upstream_calls": 0, "coalesced": 0, "rejected": 0, "cancelled": 0}
+        self._stats_lock = threading.Lock()
+        self._endpoints = {}  # endpoint -> {counters, upstream / served LatencyWindow}
+        self._hedged_calls = {}
+        self._pool = None
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _endpoint(self, endpoint):
+        with self._stats_lock:
+            entry = self._endpoints.get(endpoint)
+            if entry is None:
+                entry = self._endpoints[endpoint] = {
+                    "counters": dict.fromkeys(ENDPOINT_COUNTERS, 0),
+                    "upstream": LatencyWindow(self.slo.window),
+                    "served": LatencyWindow(self.slo.window),
+                }
+            return entry
+
+    def _count_endpoint(self, endpoint, name):
+        entry = self._endpoint(endpoint)
+        with self._stats_lock:
+            entry["counters"][name] += 1
+
+    def _prompt_key(self, messages, kwargs):
+        raw = json.dumps([self.config.model, messages, kwargs], sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _upstream(self, messages, kwargs, acquire=True):
+        if acquire:
+            self.limiter.acquire_global()
+        self._count("upstream_calls")
+        response = self.client.chat.completions.create(model=self.config.model, messages=messages, **kwargs)
+        return response.choices[0].message.content
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._stats_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.slo.upstream_threads, thread_name_prefix="llm-upstream"
+                    )
+        return self._pool
+
+    def _timed_upstream(self, messages, kwargs, window, acquire=True):
+        start = time.monotonic()
+        content = self._upstream(messages, kwargs, acquire)
+        window.add(time.monotonic() - start)
+        return content
+
+    def hedge_delay(self, endpoint, budget):
+        """Seconds to wait for the primary call before sending a hedge."""
+        observed = self._endpoint(endpoint)["upstream"].percentile(self.slo.hedge_percentile, self.slo.min_samples)
+        delay = budget * self.slo.hedge_default_fraction if observed is None else observed
+        return max(self.slo.hedge_min_delay, delay)
+
+    def _start_call(self, endpoint, key, messages, kwargs):
+        """The in-flight call for this prompt, started if there is none; second value is True if joined."""
+        pool = self._get_pool()
+        with self._stats_lock:
+            call = self._hedged_calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                return call, True
+            window = self._endpoints[endpoint]["upstream"]
+            primary = pool.submit(self._timed_upstream, messages, kwargs, window)
+            call = self._hedged_calls[key] = _HedgedCall(primary)
+
+        def settle(future):
+            # forget the call once it has an answer, or every attempt failed
+            with call.lock:
+                succeeded = not future.cancelled() and future.exception() is None
+                finished = succeeded or all(f.done() for f in call.futures)
+            if finished:
+                with self._stats_lock:
+                    if self._hedged_calls.get(key) is call:
+                        del self._hedged_calls[key]
+
+        primary.add_done_callback(settle)
+        call.settle = settle
+        return call, False
+
+    def _leave_call(self, key, call):
+        """
+        A request stops waiting on call. Once nobody waits, upstream attempts
+        still queued in the pool are cancelled: after an upstream slowdown the
+        backlog would otherwise still be sent, spending tokens and the global
+        rate budget on answers nobody reads.
+        """
+        with self._stats_lock:
+            call.waiters -= 1
+            if call.waiters > 0:
+                return
+            # nobody can join it any more; the next identical prompt starts afresh
+            if self._hedged_calls.get(key) is call:
+                del self._hedged_calls[key]
+        with call.lock:
+            futures = list(call.futures)
+        cancelled = sum(future.cancel() for future in futures)
+        if cancelled:
+            with self._stats_lock:
+                self.stats["cancelled"] += cancelled
+
+    def _maybe_hedge(self, endpoint, call, messages, kwargs):
+        with call.lock:
+            if len(call.futures) > 1 or call.futures[0].done():
+                return
+            # a hedge only goes out if the global limiter has a token right now
+            if not self.limiter.try_acquire_global():
+                return
+            window = self._endpoints[endpoint]["upstream"]
+            hedge = self._get_pool().submit(self._timed_upstream, messages, kwargs, window, False)
+            call.futures.append(hedge)
+        self._count_endpoint(endpoint, "hedged")
+        hedge.add_done_callback(call.settle)
+
+    def complete_within(self, endpoint, messages, fallback, client_id=None, budget=None, **kwargs):
+        """
+        Completion text for messages within endpoint's latency budget, hedging
+        a slow call once; fallback() is returned instead when the budget runs
+        out or the upstream fails. Returns (text, fell_back). Without SLO mode
+        this is complete().
+        """
+        if not self.slo.enabled:
+            return self.complete(messages, client_id=client_id, **kwargs), False
+
+        start = time.monotonic()
+        budget = self.slo.budget(endpoint) if budget is None else budget
+        deadline = start + budget
+        entry = self._endpoint(endpoint)
+        self._count("requests")
+        self._count_endpoint(endpoint, "requests")
+
+        def give_up(reason):
+            self._count_endpoint(endpoint, f"fallback_{reason}")
+            entry["served"].add(time.monotonic() - start)
+            return fallback(), True
+
+        # waiting for the client's token counts against the budget
+        try:
+            self.limiter.acquire_client(client_id, max_wait=max(0.0, budget))
+        except RateLimitExceeded as e:
+            if e.retry_after > self.limiter._max_wait():
+                self._count("rejected")
+                raise
+            # a token would come within LLM_MAX_WAIT, but not within the budget
+            return give_up("rate_limited")
+
+        if time.monotonic() >= deadline:
+            return give_up("timeout")
+        key = self._prompt_key(messages, kwargs)
+        call, joined = self._start_call(endpoint, key, messages, kwargs)
+        if joined:
+            self._count("coalesced")
+            self._count_endpoint(endpoint, "coalesced")
+        hedge_at = call.started + self.hedge_delay(endpoint, budget)
+
+        try:
+            while True:
+                with call.lock:
+                    futures = list(call.futures)
+                for future in futures:
+                    if future.done() and not future.cancelled() and future.exception() is None:
+                        if future is not futures[0]:
+                            self._count_endpoint(endpoint, "hedge_wins")
+                        entry["served"].add(time.monotonic() - start)
+                        return future.result(), False
+                pending = [f for f in futures if not f.done()]
+                if not pending:
+                    return give_up("error")
+
+                now = time.monotonic()
+                if now >= deadline:
+                    return give_up("timeout")
+                if len(futures) == 1 and now >= hedge_at:
+                    self._maybe_hedge(endpoint, call, messages, kwargs)
+                    hedge_at = float("inf")
+                    continue
+                wait(pending, timeout=min(deadline, hedge_at) - now, return_when=FIRST_COMPLETED)
+        finally:
+            self._leave_call(key, call)
+
+    def metrics(self) -> dict:
+        """Per-endpoint hedge / fallback rates and latencies for this process."""
+        with self._stats_lock:
+            endpoints = {name: (dict(entry["counters"]), entry) for name, entry in self._endpoints.items()}
+            totals = dict(self.stats)
+        report = {}
+        for name, (counters, entry) in endpoints.items():
+            requests = counters["requests"] or 1
+            fallbacks = counters["fallback_timeout"] + counters["fallback_error"] + counters["fallback_rate_limited"]
+            report[name] = {
+                **counters,
+                "budget_s": self.slo.budget(name),
+                "hedge_rate": round(counters["hedged"] / requests, 4),
+                "hedge_win_rate": round(counters["hedge_wins"] / counters["hedged"], 4) if counters["hedged"] else None,
+                "fallback_rate": round(fallbacks / requests, 4),
+                "upstream_p50_s": entry["upstream"].percentile(50),
+                f"upstream_p{self.slo.hedge_percentile:g}_s": entry["upstream"].percentile(self.slo.hedge_percentile),
+                "served_p99_s": entry["served"].percentile(99),
+            }
+        return {"slo_mode": self.slo.enabled, "totals": totals, "endpoints": report}
+
+    def complete(self, messages, client_id=None, **kwargs) -> str:
+        """Return the completion text for messages, coalesced and rate limited."""
+        self._count("requests")
+        try:
+            self.limiter.acquire_client(client_id)
+            content, coalesced = self.flight.do(
+                self._prompt_key(messages, kwargs), lambda: self._upstream(messages, kwargs)
+            )
+        except RateLimitExceeded:
+            self._count("rejected")
+            raise
+        if coalesced:
+            self._count("coalesced")
+        return content
+
+
+# --------------------- local burst simulator ---------------------
+
+class _FakeMessage:
+    def __init__(self, content):
+        self.content = content
+
+
+class _FakeChoice:
+    def __init__(self, content):
+        self.message = _FakeMessage(content)
+
+
+class _FakeResponse:
+    def __init__(self, content):
+        self.choices = [_FakeChoice(content)]
+
+
+class FakeUpstream:
+    """
+    Stands in for the Groq client: sleeps for a random latency and echoes.
+    With probability tail_prob a call is tail_factor times slower.
+    """
+
+    def __init__(self, latency=0.5, jitter=0.2, tail_prob=0.0, tail_factor=10.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.tail_prob = tail_prob
+        self.tail_factor = tail_factor
+        self.chat = self
+        self.completions = self
+
+    def create(self, model, messages, **kwargs):
+        latency = max(0.0, random.gauss(self.latency, self.jitter))
+        if random.random() < self.tail_prob:
+            latency *= self.tail_factor
+        time.sleep(latency)
+        return _FakeResponse(f"echo: {messages[-1]['content'][:40]}")
+
+
+def simulate(requests=200, clients=10, distinct_prompts=20, concurrency=50, config: LLMClientConfig = None,
+             slo: SLOConfig = None, tail_prob=0.0):
+    """Burst against FakeUpstream; with slo given, requests go through complete_within."""
+    llm = LLMClient(FakeUpstream(tail_prob=tail_prob), config or LLMClientConfig(), slo or SLOConfig(enabled=False))
+    latencies = []
+
+    def one(i):
+        client_id = f"client-{i % clients}"
+        prompt = f"profile-{random.randrange(distinct_prompts)}"
+        messages = [{"role": "user", "content": prompt}]
+        start = time.perf_counter()
+        try:
+            if llm.slo.enabled:
+                llm.complete_within("simulated", messages, fallback=lambda: "template", client_id=client_id)
+            else:
+                llm.complete(messages, client_id=client_id)
+            latencies.append(time.perf_counter() - start)
+        except RateLimitExceeded:
+            pass
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    pct = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else None
+    result = {**llm.stats, "elapsed_s": round(elapsed, 2), "p50_s": pct(0.5), "p99_s": pct(0.99)}
+    if llm.slo.enabled:
+        result["slo"] = llm.metrics()["endpoints"].get("simulated")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate a burst of LLM requests against a fake upstream")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--distinct-prompts", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--policy", choices=["queue", "reject"], default="queue")
+    parser.add_argument("--budget", type=float, default=None, help="enable SLO mode with this budget (seconds)")
+    parser.add_argument("--tail-prob", type=float, default=0.0, help="share of upstream calls that are 10x slower")
+    args = parser.parse_args()
+
+    slo = SLOConfig(enabled=True, default_budget=args.budget, budgets={}) if args.budget else None
+    print(simulate(args.requests, args.clients, args.distinct_prompts, args.concurrency,
+                   LLMClientConfig(policy=args.policy), slo, args.tail_prob))
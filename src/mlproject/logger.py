@@ -1,20 +1,156 @@
-# Logging is used to track what your code is doing while it runs—especially useful 
+# Logging is used to track what your code is doing while it runs—especially useful
 # for debugging, monitoring, and understanding errors.
 # It’s a powerful alternative to just using print() statements.
+#
+# Importing this module configures nothing: modules keep doing
+# `from src.mlproject.logger import logging`, and each entry point (main.py,
+# the FastAPI app, every gunicorn worker) calls configure_logging() once.
+# Log calls then only put the record on an in-memory queue; a background
+# QueueListener thread formats it and writes the rotating file, so request
+# threads never block on disk I/O.
 
+import atexit
+import json
 import logging
+import logging.handlers
 import os
-from datetime import datetime
+import queue
+import re
+import sys
+import time
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
 
-LOG_FILE = f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log"
-log_path = os.path.join(os.getcwd()  , "logs" , LOG_FILE) # getcurrent working directory path
 
-os.makedirs(log_path , exist_ok = True) # this code is used to make directory 
-# (exist_ok = True means if the directory already exists, it won't raise an error)
-LOG_FILE_PATH  = os.path.join(log_path , LOG_FILE) # log_path is logs folder_name anf LOG_FILE is the name of the log file
+@dataclass
+class LoggingConfig:
+    log_dir: str = os.getenv("LOG_DIR", "logs")
+    level: str = os.getenv("LOG_LEVEL", "INFO")
+    # json (one object per line) or text (the original line format)
+    log_format: str = os.getenv("LOG_FORMAT", "json")
+    # size: rotate at max_bytes; time: rotate at midnight
+    rotation: str = os.getenv("LOG_ROTATION", "size")
+    max_bytes: int = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    backup_count: int = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+    # also write to stderr (containers that collect stdout/stderr)
+    console: bool = os.getenv("LOG_CONSOLE", "0") == "1"
+    # files of processes that have exited are deleted at startup once older than this
+    retention_days: float = float(os.getenv("LOG_RETENTION_DAYS", "7"))
 
-logging.basicConfig(
-    filename = LOG_FILE_PATH ,
-    format = "[%(asctime)s] %(lineno)d %(name)s - %(levelname)s - %(message)s",
-    level = logging.INFO,
-)
+
+TEXT_FORMAT = "[%(asctime)s] %(lineno)d %(name)s - %(levelname)s - %(message)s"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "thread": record.threadName,
+            "module": record.module,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+_lock = threading.Lock()
+_state = {"pid": None, "listener": None, "handler": None, "path": None}
+
+
+def _file_handler(config: LoggingConfig, path):
+    if config.rotation == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            path, when="midnight", backupCount=config.backup_count, encoding="utf-8", delay=True
+        )
+    return logging.handlers.RotatingFileHandler(
+        path, maxBytes=config.max_bytes, backupCount=config.backup_count, encoding="utf-8", delay=True
+    )
+
+
+def _pid_alive(pid):
+    if os.name == "nt":
+        # os.kill(pid, 0) would terminate the process on Windows; rely on age alone
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _prune_old_logs(config: LoggingConfig, name):
+    """
+    Every process writes its own <name>-<pid>.log (plus rotated backups), so
+    restarts and recycled gunicorn workers leave files behind. Delete those
+    of processes that are gone, once untouched for retention_days.
+    """
+    pattern = re.compile(rf"{re.escape(name)}-(\d+)\.log(\..+)?")
+    cutoff = time.time() - config.retention_days * 86400
+    for file_name in os.listdir(config.log_dir):
+        match = pattern.fullmatch(file_name)
+        if match is None or int(match.group(1)) == os.getpid():
+            continue
+        path = os.path.join(config.log_dir, file_name)
+        try:
+            if os.path.getmtime(path) < cutoff and not _pid_alive(int(match.group(1))):
+                os.remove(path)
+        except OSError:
+            # another worker pruned it first
+            pass
+
+
+def configure_logging(config: LoggingConfig = None, name: str = "app"):
+    """
+    Route the root logger through a queue to a background listener writing
+    <log_dir>/<name>-<pid>.log. Idempotent within a process; a forked child
+    (gunicorn worker) calling it again gets its own listener thread and file,
+    since the parent's thread does not survive the fork. Old files of exited
+    processes are pruned (see _prune_old_logs).
+    Returns the log file path.
+    """
+    config = config or LoggingConfig()
+    with _lock:
+        pid = os.getpid()
+        if _state["pid"] == pid:
+            return _state["path"]
+
+        root = logging.getLogger()
+        if _state["handler"] is not None:
+            # inherited from the parent across fork: its listener thread is gone
+            root.removeHandler(_state["handler"])
+
+        os.makedirs(config.log_dir, exist_ok=True)
+        _prune_old_logs(config, name)
+        path = os.path.join(config.log_dir, f"{name}-{pid}.log")
+        formatter = JsonFormatter() if config.log_format == "json" else logging.Formatter(TEXT_FORMAT)
+        handlers = [_file_handler(config, path)]
+        if config.console:
+            handlers.append(logging.StreamHandler(sys.stderr))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+
+        root.addHandler(queue_handler)
+        root.setLevel(config.level.upper())
+        _state.update(pid=pid, listener=listener, handler=queue_handler, path=path)
+        return path
+
+
+@atexit.register
+def _stop_listener():
+    # flush whatever is still queued before the interpreter exits
+    listener = _state["listener"]
+    if listener is not None and _state["pid"] == os.getpid():
+        listener.stop()
@@ -0,0 +1,51 @@
+# onnxruntime inference for the exported preprocessor + model graph.
+#
+# Kept apart from components/model_export.py (and src.mlproject.utils) so
+# predictions served through ONNX import neither sklearn nor the ONNX
+# converters. The similarity index (/similar-patients, /chat context) still
+# needs sklearn and loads it on first use.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import onnxruntime as ort
+except Exception:
+    ort = None
+
+# per-request intra-op threads (gunicorn already runs many request threads)
+INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "1"))
+
+
+def make_session(model_bytes, intra_op_threads=INTRA_OP_THREADS):
+    """
+    onnxruntime CPU session tuned for small requests: gunicorn already runs
+    many request threads, so each inference uses a single intra-op thread.
+    """
+    if ort is None:
+        raise ImportError("onnxruntime is not installed; install it to serve PREDICT_BACKEND=onnx.")
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(model_bytes, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+def onnx_feed(session, df: pd.DataFrame):
+    # one [n, 1] float input per feature column, named after the column
+    return {
+        inp.name: df[inp.name].to_numpy(dtype=np.float32).reshape(-1, 1)
+        for inp in session.get_inputs()
+    }
+
+
+def run_onnx(session, df: pd.DataFrame):
+    """Return (labels, probabilities) as numpy arrays for the rows of df."""
+    label, proba = session.run(None, onnx_feed(session, df))[:2]
+    if isinstance(proba, list):
+        # CatBoost emits a ZipMap: one {class: probability} dict per row
+        proba = [[row[k] for k in sorted(row)] for row in proba]
+    return np.asarray(label).ravel(), np.asarray(proba, dtype=np.float64)
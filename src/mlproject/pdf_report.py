@@ -0,0 +1,253 @@
+# PDF report for clinicians: prediction, diet plan, risk report and doctor's note.
+#
+# Rendering is CPU bound (pure python fpdf2), so it runs in a small process
+# pool instead of on the event loop or the request thread pool. Each pool
+# process builds the report template and locates the Unicode fonts once in
+# its initializer. Finished PDFs are kept in an in-memory LRU keyed by the
+# hash of the report inputs, and concurrent requests for the same report
+# share one render.
+#
+# Text is set in Noto Sans, with Noto Sans Devanagari / Bengali / Tamil as
+# fallbacks for the Hindi, Bengali and Tamil sections, shaped by HarfBuzz.
+# The fonts come from REPORT_FONT_DIR (default assets/fonts) or a system
+# install of the Noto fonts (Debian's fonts-noto-core, see Aptfile).
+
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+
+from src.mlproject.logger import logging
+
+# HarfBuzz shaping (conjuncts, vowel signs) for the Indic scripts
+try:
+    import uharfbuzz
+except Exception:
+    uharfbuzz = None
+
+
+@dataclass
+class ReportConfig:
+    workers: int = int(os.getenv("REPORT_WORKERS", "1"))
+    cache_size: int = int(os.getenv("REPORT_CACHE_SIZE", "256"))
+    # how many reports may gather their LLM sections at once
+    max_concurrent: int = int(os.getenv("REPORT_CONCURRENCY", "4"))
+
+
+def _font_dirs():
+    dirs = [os.getenv("REPORT_FONT_DIR", os.path.join("assets", "fonts"))]
+    # fonts-noto-core, installed by apt or by Heroku's apt buildpack (/app/.apt)
+    dirs += ["/usr/share/fonts/truetype/noto", os.path.join(".apt", "usr", "share", "fonts", "truetype", "noto")]
+    return tuple(dirs)
+
+
+@dataclass
+class ReportTemplate:
+    title: str = "Heart Disease Risk Report"
+    font: str = "NotoSans"
+    title_size: int = 16
+    heading_size: int = 13
+    body_size: int = 10
+    line_height: float = 5.5
+    font_dirs: tuple = field(default_factory=_font_dirs)
+    font_files: dict = field(default_factory=lambda: {"": "NotoSans-Regular.ttf", "B": "NotoSans-Bold.ttf"})
+    # family -> (file, first and last code point of the script's Unicode block)
+    script_fonts: dict = field(default_factory=lambda: {
+        "NotoSansDevanagari": ("NotoSansDevanagari-Regular.ttf", 0x0900, 0x097F),
+        "NotoSansBengali": ("NotoSansBengali-Regular.ttf", 0x0980, 0x09FF),
+        "NotoSansTamil": ("NotoSansTamil-Regular.ttf", 0x0B80, 0x0BFF),
+    })
+    sections: tuple = (
+        ("risk_report", "Risk Report"),
+        ("diet_plan", "Diet Plan"),
+        ("doctor_note", "Doctor's Note"),
+    )
+    profile_labels: dict = field(default_factory=lambda: {
+        "age": "Age", "sex": "Sex", "cp": "Chest Pain Type", "trestbps": "Resting BP (mm Hg)",
+        "chol": "Cholesterol (mg/dL)", "fbs": "Fasting Sugar > 120", "restecg": "ECG Results",
+        "thalach": "Max Heart Rate", "exang": "Exercise Angina", "oldpeak": "ST Depression",
+        "slope": "ST Slope", "ca": "Major Vessels", "thal": "Thalassemia",
+    })
+
+    def find_font(self, file_name):
+        for font_dir in self.font_dirs:
+            path = os.path.join(font_dir, file_name)
+            if os.path.exists(path):
+                return path
+        return None
+
+
+class ReportFonts:
+    """
+    Resolved font files for one process. fpdf2 subsets a font in place when
+    it writes a document, so parsed fonts can't be shared between reports;
+    each render adds the base font and only the script fonts its text uses.
+    """
+
+    def __init__(self, template: ReportTemplate):
+        self.base = {style: template.find_font(name) for style, name in template.font_files.items()}
+        self.scripts = {}
+        for family, (name, first, last) in template.script_fonts.items():
+            path = template.find_font(name)
+            if path is None:
+                logging.warning(f"PDF reports: {name} not found in {template.font_dirs}; that script will not render")
+            else:
+                self.scripts[family] = (path, first, last)
+        self.unicode = all(self.base.values())
+        if not self.unicode:
+            logging.warning(
+                f"PDF reports: Noto Sans not found in {template.font_dirs}; "
+                "falling back to Helvetica, which only covers latin-1"
+            )
+
+    def apply(self, pdf: FPDF, template: ReportTemplate, text: str) -> str:
+        """Add the fonts text needs to pdf; returns the family to set."""
+        if not self.unicode:
+            return "Helvetica"
+        for style, path in self.base.items():
+            pdf.add_font(template.font, style, path)
+        used = {ord(ch) for ch in text if ord(ch) > 0x024F}
+        fallbacks = []
+        for family, (path, first, last) in self.scripts.items():
+            if any(first <= cp <= last for cp in used):
+                pdf.add_font(family, "", path)
+                fallbacks.append(family)
+        if fallbacks:
+            # bold headings in these scripts use the regular face
+            pdf.set_fallback_fonts(fallbacks, exact_match=False)
+        if uharfbuzz is not None:
+            pdf.set_text_shaping(True)
+        return template.font
+
+
+_template = None
+_fonts = None
+
+
+def _init_worker():
+    global _template, _fonts
+    _template = ReportTemplate()
+    _fonts = ReportFonts(_template)
+    # warm up: imports fontTools / HarfBuzz and pulls the font files into the page cache
+    render_report_pdf({"profile": {}, "prediction": 0, "sections": {"risk_report": "\u0928\u092e\u0938\u094d\u0924\u0947"}})
+
+
+def _latin1(text) -> str:
+    # Helvetica (no Noto fonts installed) only covers latin-1: fold accents, drop the rest
+    text = unicodedata.normalize("NFKD", str(text))
+    return text.encode("latin-1", "ignore").decode("latin-1")
+
+
+def render_report_pdf(payload: dict) -> bytes:
+    """Render {"profile", "prediction", "sections"} into PDF bytes."""
+    global _template, _fonts
+    if _template is None:
+        _template = ReportTemplate()
+    if _fonts is None:
+        _fonts = ReportFonts(_template)
+    template = _template
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    font = _fonts.apply(pdf, template, " ".join(str(v) for v in payload["sections"].values()))
+    clean = (lambda text: str(text)) if _fonts.unicode else _latin1
+    pdf.add_page()
+
+    def line(height, text, align="L"):
+        pdf.cell(0, height, clean(text), new_x=XPos.LMARGIN, new_y=YPos.NEXT, align=align)
+
+    pdf.set_font(font, "B", template.title_size)
+    line(10, template.title, align="C")
+
+    risk = "High" if payload["prediction"] == 1 else "Low"
+    pdf.set_font(font, "B", template.heading_size)
+    line(8, f"Predicted risk: {risk}")
+
+    pdf.set_font(font, "", template.body_size)
+    for key, label in template.profile_labels.items():
+        if key in payload["profile"]:
+            line(template.line_height, f"{label}: {payload['profile'][key]}")
+
+    for key, heading in template.sections:
+        text = payload["sections"].get(key)
+        if not text:
+            continue
+        pdf.ln(4)
+        pdf.set_font(font, "B", template.heading_size)
+        line(8, heading)
+        pdf.set_font(font, "", template.body_size)
+        pdf.multi_cell(0, template.line_height, clean(text), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    return bytes(pdf.output())
+
+
+def report_key(*parts) -> str:
+    raw = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+class ReportRenderer:
+    def __init__(self, config: ReportConfig = None):
+        self.config = config or ReportConfig()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._gate = None
+
+    @property
+    def gate(self) -> asyncio.Semaphore:
+        # created lazily so it binds to the worker's running loop
+        if self._gate is None:
+            self._gate = asyncio.Semaphore(self.config.max_concurrent)
+        return self._gate
+
+    def _get_pool(self):
+        # created on first use, i.e. in the serving worker rather than the
+        # preloading gunicorn master; spawned, not forked, from the threaded worker
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.config.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                    )
+        return self._pool
+
+    def cached(self, key):
+        pdf = self._cache.get(key)
+        if pdf is not None:
+            self._cache.move_to_end(key)
+        return pdf
+
+    async def render(self, key, payload: dict, cache: bool = True) -> bytes:
+        pdf = self.cached(key)
+        if pdf is not None:
+            return pdf
+
+        future = self._inflight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._get_pool(), render_report_pdf, payload)
+            self._inflight[key] = future
+            try:
+                pdf = await asyncio.shield(future)
+            finally:
+                self._inflight.pop(key, None)
+            if cache:
+                self._cache[key] = pdf
+                if len(self._cache) > self.config.cache_size:
+                    self._cache.popitem(last=False)
+            return pdf
+
+        return await asyncio.shield(future)
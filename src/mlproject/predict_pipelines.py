@@ -1,20 +1,131 @@
 # src/mlproject/predict_pipeline.py
 
+import os
 import pickle
+import threading
 import numpy as np
 import pandas as pd
 
+from src.mlproject.artifact_store import ArtifactStore
+from src.mlproject.logger import logging
+
+# Legacy locations, used when no artifact manifest has been published yet
+MODEL_PATH = os.path.join("artifacts", "model.pkl")
+PREPROCESSOR_PATH = os.path.join("artifact", "preprocessor.pkl")
+
+
 class PredictPipeline:
-    def __init__(self):
-        with open("artifacts/model.pkl", "rb") as f:
-            self.model = pickle.load(f)
-        with open("artifact/preprocessor.pkl", "rb") as f:
-            self.preprocessor = pickle.load(f)
+    def __init__(self, store: ArtifactStore = None):
+        self.store = store or ArtifactStore()
+        self.manifest, objects = self.store.load_run(names=("model", "preprocessor"))
+
+        if self.manifest is not None:
+            self.model = objects["model"]
+            self.preprocessor = objects["preprocessor"]
+        else:
+            with open(MODEL_PATH, "rb") as f:
+                self.model = pickle.load(f)
+            with open(PREPROCESSOR_PATH, "rb") as f:
+                self.preprocessor = pickle.load(f)
+
+    @property
+    def run_id(self):
+        return self.manifest["run_id"] if self.manifest else None
+
+    @property
+    def feature_spreads(self):
+        """Training-data std of the modifiable features (what-if distances)."""
+        from src.mlproject.what_if import feature_spreads
+
+        return feature_spreads(self.preprocessor)
 
     def predict(self, data: dict):
         df = pd.DataFrame([data])
-    
+
         transformed_data = self.preprocessor.transform(df)
         prediction = self.model.predict(transformed_data)[0]
-    
+
         return prediction
+
+    def predict_risk(self, df: pd.DataFrame) -> np.ndarray:
+        """Probability of heart disease for every row of df, in one vectorized call."""
+        transformed_data = self.preprocessor.transform(df)
+        return self.model.predict_proba(transformed_data)[:, 1]
+
+
+class OnnxPredictPipeline:
+    """
+    Serves the exported preprocessor + model graph through onnxruntime, so
+    the serving process needs neither the pickled sklearn objects nor the
+    training library versions that produced them. Only a graph published
+    with the current run is served: a streaming run or a failed parity check
+    publishes none, and an older model.onnx must not be paired with a newer run.
+    """
+
+    def __init__(self, store: ArtifactStore = None):
+        from src.mlproject.onnx_serving import make_session
+
+        self.store = store or ArtifactStore()
+        self.manifest = self.store.load_manifest()
+        if self.manifest is None or "model_onnx" not in self.manifest["artifacts"]:
+            raise FileNotFoundError("The current artifact run has no ONNX export (model_onnx)")
+
+        model_bytes = self.store.get(self.manifest["artifacts"]["model_onnx"], mmap_mode=None)
+        self.session = make_session(model_bytes)
+
+    @property
+    def run_id(self):
+        return self.manifest["run_id"] if self.manifest else None
+
+    @property
+    def feature_spreads(self):
+        """
+        Recorded by ModelExporter next to the graph; older exports fall back
+        to unpickling the run's preprocessor (and so importing sklearn).
+        """
+        spreads = self.manifest["metadata"].get("feature_spreads")
+        if spreads is None:
+            from src.mlproject.what_if import feature_spreads
+
+            spreads = feature_spreads(self.store.get(self.manifest["artifacts"]["preprocessor"]))
+            self.manifest["metadata"]["feature_spreads"] = spreads
+        return spreads
+
+    def predict(self, data: dict):
+        from src.mlproject.onnx_serving import run_onnx
+
+        labels, _ = run_onnx(self.session, pd.DataFrame([data]))
+        return labels[0]
+
+    def predict_risk(self, df: pd.DataFrame) -> np.ndarray:
+        from src.mlproject.onnx_serving import run_onnx
+
+        _, proba = run_onnx(self.session, df)
+        return proba[:, 1]
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_predict_pipeline():
+    """
+    Process-wide predict pipeline; PREDICT_BACKEND=onnx serves the exported
+    ONNX graph instead of the pickles. Under gunicorn's preload mode this is first
+    called in the master (see gunicorn.conf.py), so every forked worker shares
+    the already loaded model pages instead of unpickling its own copy.
+    """
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                backend = os.getenv("PREDICT_BACKEND", "pickle")
+                if backend == "onnx":
+                    try:
+                        _pipeline = OnnxPredictPipeline()
+                    except FileNotFoundError as e:
+                        logging.warning(f"PREDICT_BACKEND=onnx: {e}; serving the pickle model instead")
+                        _pipeline = PredictPipeline()
+                else:
+                    _pipeline = PredictPipeline()
+    return _pipeline
@@ -0,0 +1,39 @@
+# Memory numbers for the current process, read from /proc (Linux only).
+#
+# rss_kb    - resident pages, shared ones included
+# pss_kb    - proportional set size: shared pages divided by the number of
+#             processes sharing them, the honest "cost" of one worker
+# shared_kb - resident pages that are also mapped by another process
+#             (copy-on-write pages from the gunicorn master, mmapped models)
+
+import os
+
+
+def _read_kb_fields(path, fields):
+    values = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in fields:
+                    values[name] = int(rest.split()[0])
+    except OSError:
+        pass
+    return values
+
+
+def process_memory():
+    status = _read_kb_fields("/proc/self/status", {"VmRSS", "VmHWM"})
+    rollup = _read_kb_fields(
+        "/proc/self/smaps_rollup", {"Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"}
+    )
+    shared = rollup.get("Shared_Clean", 0) + rollup.get("Shared_Dirty", 0) if rollup else None
+    private = rollup.get("Private_Clean", 0) + rollup.get("Private_Dirty", 0) if rollup else None
+    return {
+        "pid": os.getpid(),
+        "rss_kb": status.get("VmRSS"),
+        "peak_rss_kb": status.get("VmHWM"),
+        "pss_kb": rollup.get("Pss"),
+        "shared_kb": shared,
+        "private_kb": private,
+    }
@@ -7,55 +7,61 @@ from dotenv import load_dotenv
 from sklearn.metrics import r2_score
 from sklearn.model_selection import GridSearchCV
 from sklearn.model_selection import train_test_split
-# Avoid importing optional DB client at module import to prevent hard failures
-try:
-    import pymysql  # optional; only needed if reading from MySQL
-except Exception:
-    pymysql = None
 import pickle
+import time
 import numpy as np
+from src.mlproject.artifact_store import atomic_write_bytes
+from src.mlproject.features import FEATURE_COLUMNS
 load_dotenv()
 
-host = os.getenv("host")
-user = os.getenv("user")
-password = os.getenv("password")
-db = os.getenv("db")
-
-
 
 # Read SQL data
-# This function connects to a MySQL database and reads data from a table named 'student'.
+# Pulls new rows from the MySQL table (see components/sql_ingestion.py for the
+# chunked, incremental pull) and returns everything ingested so far.
 
 def read_sql_data():
     
     logging.info("Reading SQL database started")
     try:
-        if pymysql is None:
-            raise CustomException("pymysql not installed; install it or use CSV ingestion.")
-        mydb = pymysql.connect(
-            host = host,
-            user = user,
-            password = password,
-            db = db
-        )
-        logging.info(f"Connection Established: {mydb}")
-        df = pd.read_sql_query('Select * from heart' , mydb)
-        return df
-        
+        from src.mlproject.components.sql_ingestion import SqlIngestion
+        sql_ingestion = SqlIngestion()
+        sql_ingestion.pull()
+        # only the model's columns: the watermark (id, updated_at, ...) is not a feature
+        return sql_ingestion.read_parts(columns = FEATURE_COLUMNS + ['target'])
     
     except Exception as ex:
-        raise CustomException(ex)
+        raise CustomException(ex , sys)
+
+
+def read_sql_chunks(chunksize = None):
+    # like read_sql_data, but yields the pulled rows chunk by chunk (out-of-core)
+    logging.info("Reading SQL database in chunks started")
+    try:
+        from src.mlproject.components.sql_ingestion import SqlIngestion
+        sql_ingestion = SqlIngestion()
+        sql_ingestion.pull()
+        return sql_ingestion.iter_parts(chunksize , columns = FEATURE_COLUMNS + ['target'])
+
+    except Exception as ex:
+        raise CustomException(ex , sys)
     
 def save_object(file_path , obj)    :
+    # pickle to a temp file in the same directory and rename it over the
+    # target, so a process reading file_path never sees a truncated pickle
     try:
-        dir_path = os.path.dirname(file_path)
-        os.makedirs(dir_path , exist_ok = True)
-        
-        with open(file_path , 'wb') as file_obj:
-            pickle.dump(obj , file_obj)
+        atomic_write_bytes(file_path , pickle.dumps(obj))
             
     except Exception as e:
         raise CustomException(e , sys)        
+
+
+def load_object(file_path):
+    try:
+        with open(file_path , 'rb') as file_obj:
+            return pickle.load(file_obj)
+
+    except Exception as e:
+        raise CustomException(e , sys)
     
 
 from sklearn.model_selection import GridSearchCV
@@ -66,8 +72,135 @@ import sys
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 
 from sklearn.preprocessing import LabelEncoder
+from sklearn.base import clone
+from sklearn.model_selection import ParameterGrid, check_cv
+from sklearn.utils.class_weight import compute_class_weight
+import warnings
+
+
+def supports_staged_search(model, para):
+    """
+    True when the grid searches n_estimators on an ensemble that can score
+    every size from a single fit: boosting via staged_predict, forests by
+    growing with warm_start.
+    """
+    grid = para if isinstance(para, list) else [para]
+    if not grid or not all('n_estimators' in p for p in grid):
+        return False
+    sizes = {n for p in grid for n in p['n_estimators']}
+    return len(sizes) > 1 and (hasattr(model, 'staged_predict') or 'warm_start' in model.get_params())
+
 
-def evaluate_model(X_train, y_train, X_test, y_test, models, param):
+def _score_n_estimators_path(estimator, sizes, X_train, y_train, X_val, y_val):
+    # {n_estimators: validation accuracy} for every size, from one fit
+    scores = {}
+    if hasattr(estimator, 'staged_predict'):
+        estimator.set_params(n_estimators=sizes[-1])
+        estimator.fit(X_train, y_train)
+        stages = estimator.staged_predict(X_val)
+        stage, stage_pred = 0, None
+        for n in sizes:
+            # AdaBoost may stop early; a fresh fit of size n would stop at the same stage
+            while stage < n:
+                try:
+                    stage_pred = next(stages)
+                except StopIteration:
+                    break
+                stage += 1
+            scores[n] = accuracy_score(y_val, stage_pred)
+    else:
+        params = estimator.get_params()
+        if params.get('class_weight') == 'balanced':
+            # same weights as the preset (computed on the full y, as fit does),
+            # spelled out so warm_start doesn't warn at every size
+            classes = np.unique(y_train)
+            weights = compute_class_weight('balanced', classes=classes, y=y_train)
+            estimator.set_params(class_weight=dict(zip(classes, weights)))
+        estimator.set_params(warm_start=True)
+        with warnings.catch_warnings():
+            # 'balanced_subsample' is per-tree anyway, and every size refits the same data
+            warnings.filterwarnings('ignore', message='class_weight presets', category=UserWarning)
+            for n in sizes:
+                estimator.set_params(n_estimators=n)
+                estimator.fit(X_train, y_train)
+                scores[n] = accuracy_score(y_val, estimator.predict(X_val))
+    return scores
+
+
+def staged_cv_results(model, para, X, y, cv=3):
+    """
+    Every candidate of the grid with its mean CV accuracy, scoring each
+    n_estimators size from one fit per fold and combination of the other
+    parameters. Same folds and scoring (accuracy) as GridSearchCV.
+    """
+    candidates = list(ParameterGrid(para))
+    folds = list(check_cv(cv, y, classifier=True).split(X, y))
+
+    groups = {}
+    for index, candidate in enumerate(candidates):
+        others = {k: v for k, v in candidate.items() if k != 'n_estimators'}
+        key = repr(sorted(others.items()))
+        groups.setdefault(key, (others, []))[1].append((index, candidate['n_estimators']))
+
+    fold_scores = np.zeros((len(candidates), len(folds)))
+    for others, members in groups.values():
+        sizes = sorted({n for _, n in members})
+        for f, (train_idx, val_idx) in enumerate(folds):
+            estimator = clone(model).set_params(**others)
+            path = _score_n_estimators_path(estimator, sizes, X[train_idx], y[train_idx], X[val_idx], y[val_idx])
+            for index, n in members:
+                fold_scores[index, f] = path[n]
+
+    return candidates, fold_scores.mean(axis=1)
+
+
+def staged_grid_search(model, para, X, y, cv=3):
+    """
+    Drop-in for GridSearchCV(model, para, cv=cv).best_params_ when the grid
+    searches n_estimators (see staged_cv_results); ties go to the first best
+    candidate in grid order, as in GridSearchCV.
+    """
+    candidates, mean_scores = staged_cv_results(model, para, X, y, cv)
+    return candidates[int(np.argmax(mean_scores))]
+
+
+def measure_inference(model, X, single_repeats=200, batch_repeats=5):
+    """
+    Serving cost of a fitted model: single-row predict_proba latency
+    (p50 / p99 over single_repeats calls, rows cycled from X), batch latency
+    per row over all of X, and pickled size.
+    """
+    predict = model.predict_proba if hasattr(model, 'predict_proba') else model.predict
+    predict(X[:1])  # warm-up
+
+    single = np.empty(single_repeats)
+    for r in range(single_repeats):
+        row = X[r % len(X)][None, :]
+        start = time.perf_counter()
+        predict(row)
+        single[r] = time.perf_counter() - start
+
+    batch = np.empty(batch_repeats)
+    for r in range(batch_repeats):
+        start = time.perf_counter()
+        predict(X)
+        batch[r] = time.perf_counter() - start
+
+    return {
+        "single_p50_ms": 1000 * float(np.percentile(single, 50)),
+        "single_p99_ms": 1000 * float(np.percentile(single, 99)),
+        "batch_ms_per_row": 1000 * float(np.median(batch)) / len(X),
+        "size_bytes": len(pickle.dumps(model)),
+    }
+
+
+def evaluate_model(X_train, y_train, X_test, y_test, models, param, details=None):
+    """
+    Tune, refit and score every model; returns {name: test accuracy}.
+    When a dict is passed as details, it is filled per model with the best
+    params, every CV candidate with its mean score, fit / predict timing and
+    serving cost from measure_inference (for tracking and model selection).
+    """
     try:
         report = {}
 
@@ -78,17 +211,45 @@ def evaluate_model(X_train, y_train, X_test, y_test, models, param):
            model = list(models.values())[i]
            para = param[list(models.keys())[i]]
            
-           gs = GridSearchCV(model, para, cv=3)
-           gs.fit(X_train, y_train)
+           start = time.perf_counter()
+           if supports_staged_search(model, para):
+               candidates, mean_scores = staged_cv_results(model, para, X_train, y_train, cv=3)
+               best_params = candidates[int(np.argmax(mean_scores))]
+           else:
+               gs = GridSearchCV(model, para, cv=3)
+               gs.fit(X_train, y_train)
+               best_params = gs.best_params_
+               candidates, mean_scores = gs.cv_results_['params'], gs.cv_results_['mean_test_score']
+           search_time = time.perf_counter() - start
            
-           model.set_params(**gs.best_params_)
+           model.set_params(**best_params)
+           start = time.perf_counter()
            model.fit(X_train, y_train)
+           fit_time = time.perf_counter() - start
            
             
            y_train_pred = model.predict(X_train)
+           start = time.perf_counter()
            y_test_pred = model.predict(X_test)
+           predict_time = time.perf_counter() - start
            score = accuracy_score(y_test, y_test_pred) 
            report[list(models.keys())[i]] = score 
+
+           if details is not None:
+               details[list(models.keys())[i]] = {
+                   "best_params": best_params,
+                   "cv_results": [
+                       {"params": candidate, "mean_test_score": float(mean)}
+                       for candidate, mean in zip(candidates, mean_scores)
+                   ],
+                   "search_time": search_time,
+                   "fit_time": fit_time,
+                   "predict_time": predict_time,
+                   "predict_ms_per_row": 1000 * predict_time / max(len(X_test), 1),
+                   "train_accuracy": accuracy_score(y_train, y_train_pred),
+                   "test_accuracy": score,
+                   **measure_inference(model, X_test),
+               }
         return report
 
     except Exception as e:
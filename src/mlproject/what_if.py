@@ -0,0 +1,112 @@
+# What-if / counterfactual sweeps for a single patient.
+#
+# The grid over one or two modifiable features is expanded into a single
+# feature matrix and scored with one predict_proba call, so a 100 x 100 sweep
+# costs one vectorized pass through the preprocessor and model instead of
+# 10,000 one-row predictions.
+
+import numpy as np
+import pandas as pd
+
+from src.mlproject.features import FEATURE_COLUMNS
+
+# features a patient can realistically change; changes are compared across
+# features in units of their spread in the training data (feature_spreads)
+MODIFIABLE_FEATURES = ("trestbps", "chol", "thalach", "oldpeak")
+
+MAX_GRID_POINTS = 40_000
+
+
+def feature_spreads(preprocessor) -> dict:
+    """
+    {feature: std} for the modifiable features, read from the fitted scaler
+    (scale_) of a batch ColumnTransformer or a StreamingPreprocessor, so the
+    spreads always match the data the served model was trained on.
+    """
+    if hasattr(preprocessor, "scale_") and hasattr(preprocessor, "columns"):
+        columns, scale = list(preprocessor.columns), preprocessor.scale_
+    else:
+        try:
+            scaler = preprocessor.named_transformers_["num_pipeline"].named_steps["scaler"]
+            columns = [c for name, _, cols in preprocessor.transformers_ if name == "num_pipeline" for c in cols]
+            scale = scaler.scale_
+        except (AttributeError, KeyError) as e:
+            raise ValueError(f"Preprocessor has no fitted numeric scaler: {e}")
+    spreads = dict(zip(columns, (float(v) for v in scale)))
+    missing = [f for f in MODIFIABLE_FEATURES if f not in spreads]
+    if missing:
+        raise ValueError(f"Preprocessor does not scale {missing}")
+    return {f: spreads[f] for f in MODIFIABLE_FEATURES}
+
+
+def expand_grid(base: dict, axes: dict) -> pd.DataFrame:
+    """One row per grid point: the base profile with the swept features replaced."""
+    mesh = np.meshgrid(*axes.values(), indexing="ij")
+    n_points = mesh[0].size
+    grid = {column: np.full(n_points, base[column], dtype=np.float64) for column in FEATURE_COLUMNS}
+    for feature, values in zip(axes, mesh):
+        grid[feature] = values.ravel()
+    return pd.DataFrame(grid, columns=FEATURE_COLUMNS)
+
+
+def minimal_flip(base: dict, grid: pd.DataFrame, labels: np.ndarray, risk: np.ndarray, base_label: int,
+                 spreads: dict):
+    """
+    Grid point with the smallest change (in units of each feature's spread,
+    see feature_spreads) whose predicted label differs from the base
+    prediction, or None.
+    """
+    flipped = np.flatnonzero(labels != base_label)
+    if flipped.size == 0:
+        return None
+
+    features = [f for f in MODIFIABLE_FEATURES if f in grid.columns]
+    deltas = np.column_stack([
+        (grid[f].to_numpy()[flipped] - base[f]) / spreads[f] for f in features
+    ])
+    distances = np.sqrt((deltas ** 2).sum(axis=1))
+    best = flipped[np.argmin(distances)]
+    return {
+        "changes": {f: float(grid[f].iloc[best]) for f in features if grid[f].iloc[best] != base[f]},
+        "risk": float(risk[best]),
+        "prediction": int(labels[best]),
+        "distance": float(distances.min()),
+    }
+
+
+def sweep(pipeline, base: dict, ranges: dict) -> dict:
+    """
+    ranges: {feature: (start, stop, steps)} for one or two modifiable features.
+    Returns the risk surface over the grid plus the smallest change that
+    flips the prediction.
+    """
+    if not 1 <= len(ranges) <= 2:
+        raise ValueError("Sweep one or two features")
+    unknown = [f for f in ranges if f not in MODIFIABLE_FEATURES]
+    if unknown:
+        raise ValueError(f"Not modifiable: {unknown}; choose from {list(MODIFIABLE_FEATURES)}")
+
+    if any(int(steps) < 1 for _, _, steps in ranges.values()):
+        raise ValueError("steps must be at least 1")
+    n_points = int(np.prod([int(steps) for _, _, steps in ranges.values()]))
+    if n_points > MAX_GRID_POINTS:
+        raise ValueError(f"Grid has {n_points} points; the limit is {MAX_GRID_POINTS}")
+    axes = {f: np.linspace(start, stop, int(steps)) for f, (start, stop, steps) in ranges.items()}
+
+    base_frame = pd.DataFrame([base], columns=FEATURE_COLUMNS)
+    base_risk = float(pipeline.predict_risk(base_frame)[0])
+    base_label = int(base_risk > 0.5)
+
+    grid = expand_grid(base, axes)
+    risk = pipeline.predict_risk(grid)
+    labels = (risk > 0.5).astype(int)  # same tie-break as predict()
+
+    shape = [len(v) for v in axes.values()]
+    return {
+        "base_risk": base_risk,
+        "base_prediction": base_label,
+        "features": list(axes),
+        "axes": {f: v.tolist() for f, v in axes.items()},
+        "risk": risk.reshape(shape).tolist(),
+        "counterfactual": minimal_flip(base, grid, labels, risk, base_label, pipeline.feature_spreads),
+    }
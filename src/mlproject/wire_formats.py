@@ -0,0 +1,320 @@
+# Request / response encodings for batch scoring (POST /predict/batch).
+#
+# A batch is columnar: one array per feature column (API labels like "Male"
+# or the numeric codes). Arrow IPC streams and MessagePack / JSON column maps
+# are decoded straight into the float64 feature frame the preprocessor
+# consumes, with no per-row objects or pydantic validation. Responses are
+# {"risk": [...], "prediction": [...]} in the format the client accepts
+# (JSON via orjson), compressed with zstd or gzip when large enough.
+#
+# Run `python -m src.mlproject.wire_formats --rows 100000` to compare the CPU
+# cost of each format against per-object pydantic JSON.
+
+import argparse
+import gzip
+import io
+import json
+import os
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from src.mlproject.features import CATEGORIES, FEATURE_COLUMNS, encode_frame
+
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+try:
+    import msgpack
+except Exception:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except Exception:
+    pa = None
+
+try:
+    import zstandard
+except Exception:
+    zstandard = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+ALIASES = {"application/x-msgpack": MSGPACK, "application/vnd.msgpack": MSGPACK}
+
+MAX_ROWS = int(os.getenv("PREDICT_BATCH_MAX_ROWS", "1000000"))
+# limits on the body as sent and after Content-Encoding is undone
+MAX_BODY_BYTES = int(os.getenv("PREDICT_BATCH_MAX_MB", "64")) * 1024 * 1024
+MAX_DECODED_BYTES = int(os.getenv("PREDICT_BATCH_MAX_DECODED_MB", "256")) * 1024 * 1024
+# responses smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("WIRE_COMPRESS_MIN_BYTES", "1400"))
+GZIP_LEVEL = int(os.getenv("WIRE_GZIP_LEVEL", "5"))
+ZSTD_LEVEL = int(os.getenv("WIRE_ZSTD_LEVEL", "3"))
+
+
+class UnsupportedFormat(ValueError):
+    pass
+
+
+def _media_type(header):
+    media_type = (header or JSON).split(";")[0].strip().lower()
+    return ALIASES.get(media_type, media_type)
+
+
+def available_formats():
+    formats = [JSON]
+    if msgpack is not None:
+        formats.append(MSGPACK)
+    if pa is not None:
+        formats.append(ARROW)
+    return formats
+
+
+def _check_available(media_type):
+    if media_type not in (JSON, MSGPACK, ARROW):
+        raise UnsupportedFormat(f"Unsupported media type {media_type!r}; use one of {available_formats()}")
+    if media_type not in available_formats():
+        raise UnsupportedFormat(f"{media_type} needs an optional dependency that is not installed")
+
+
+def _read_capped(stream) -> bytes:
+    # at most MAX_DECODED_BYTES of decompressed output, so a small bomb can't exhaust memory
+    chunks, size = [], 0
+    for chunk in iter(lambda: stream.read(1 << 20), b""):
+        size += len(chunk)
+        if size > MAX_DECODED_BYTES:
+            raise ValueError(f"Decompressed body exceeds {MAX_DECODED_BYTES} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def decompress(body: bytes, content_encoding: str = None) -> bytes:
+    if len(body) > MAX_BODY_BYTES:
+        raise ValueError(f"Body exceeds {MAX_BODY_BYTES} bytes")
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return body
+    if encoding == "gzip":
+        try:
+            return _read_capped(gzip.GzipFile(fileobj=io.BytesIO(body)))
+        except (OSError, EOFError, zlib.error) as e:
+            raise ValueError(f"Invalid gzip body: {e}")
+    if encoding == "zstd" and zstandard is not None:
+        try:
+            return _read_capped(zstandard.ZstdDecompressor().stream_reader(body))
+        except zstandard.ZstdError as e:
+            raise ValueError(f"Invalid zstd body: {e}")
+    raise UnsupportedFormat(f"Unsupported Content-Encoding {encoding!r}")
+
+
+def _frame_from_columns(columns) -> pd.DataFrame:
+    # {column: [values]} (preferred) or [{column: value}, ...]
+    if isinstance(columns, dict):
+        if not all(isinstance(values, list) for values in columns.values()):
+            raise ValueError("Each feature column must be a list of values")
+        return pd.DataFrame(columns)
+    if isinstance(columns, list):
+        if not all(isinstance(row, dict) for row in columns):
+            raise ValueError("Each row must be a map of feature values")
+        return pd.DataFrame.from_records(columns)
+    raise ValueError("Body must be a map of feature columns or a list of rows")
+
+
+def decode_batch(body: bytes, content_type: str = None) -> pd.DataFrame:
+    """Request body -> encoded feature frame (FEATURE_COLUMNS, float64)."""
+    media_type = _media_type(content_type)
+    _check_available(media_type)
+    try:
+        if media_type == ARROW:
+            table = pa.ipc.open_stream(pa.BufferReader(body)).read_all()
+            frame = table.to_pandas()
+        elif media_type == MSGPACK:
+            frame = _frame_from_columns(msgpack.unpackb(body))
+        else:
+            frame = _frame_from_columns(orjson.loads(body) if orjson is not None else json.loads(body))
+
+        if len(frame) > MAX_ROWS:
+            raise ValueError(f"Batch has {len(frame)} rows; the limit is {MAX_ROWS}")
+        return encode_frame(frame)
+    except ValueError:
+        raise
+    except Exception as e:
+        # malformed client input (bad msgpack, unexpected value types, ...) is a 4xx, not a 500
+        raise ValueError(f"Could not decode {media_type} body: {type(e).__name__}: {e}")
+
+
+def negotiate(accept: str = None, default: str = JSON) -> str:
+    """First supported media type in the Accept header (order of preference, ignoring q)."""
+    for item in (accept or "").split(","):
+        media_type = _media_type(item)
+        if media_type in ("*/*", "application/*", ""):
+            return default
+        if media_type in available_formats():
+            return media_type
+    if accept:
+        raise UnsupportedFormat(f"Cannot produce any of {accept!r}; available: {available_formats()}")
+    return default
+
+
+def encode_result(risk: np.ndarray, media_type: str) -> bytes:
+    prediction = (risk > 0.5).astype(np.int8)  # same tie-break as predict()
+    if media_type == ARROW:
+        table = pa.table({"risk": pa.array(risk, pa.float64()), "prediction": pa.array(prediction, pa.int8())})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    if media_type == MSGPACK:
+        return msgpack.packb({"risk": risk.tolist(), "prediction": prediction.tolist()})
+    if orjson is not None:
+        return orjson.dumps({"risk": risk, "prediction": prediction}, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps({"risk": risk.tolist(), "prediction": prediction.tolist()}).encode("utf-8")
+
+
+def compress(body: bytes, accept_encoding: str = None):
+    """(body, Content-Encoding or None): zstd preferred over gzip, small bodies left alone."""
+    accepted = {item.split(";")[0].strip().lower() for item in (accept_encoding or "").split(",")}
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    if "zstd" in accepted and zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body), "zstd"
+    if "gzip" in accepted:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+    return body, None
+
+
+def score_batch(pipeline, body: bytes, headers) -> tuple:
+    """
+    Decode, score and encode one batch request. headers is any mapping with
+    the request's (lower-case) HTTP headers. Returns (body, media type,
+    Content-Encoding or None, rows).
+    """
+    request_type = _media_type(headers.get("content-type"))
+    response_type = negotiate(headers.get("accept"), default=request_type)
+    frame = decode_batch(decompress(body, headers.get("content-encoding")), request_type)
+    risk = pipeline.predict_risk(frame) if len(frame) else np.empty(0)
+    # predict_proba()[:, 1] is a strided view; orjson serializes contiguous arrays only
+    payload, encoding = compress(encode_result(np.ascontiguousarray(risk, dtype=np.float64), response_type),
+                                 headers.get("accept-encoding"))
+    return payload, response_type, encoding, len(frame)
+
+
+# --------------------- benchmark ---------------------
+
+def _label_frame(rows, seed=0):
+    # realistic API-style rows (labels, not codes) resampled from the training data
+    data = pd.read_csv(os.path.join("notebook", "data", "cleaned_data.csv"))[FEATURE_COLUMNS]
+    frame = data.sample(rows, replace=True, random_state=seed).reset_index(drop=True)
+    for column, labels in CATEGORIES.items():
+        frame[column] = np.asarray(labels, dtype=object)[frame[column].astype(int).clip(0, len(labels) - 1)]
+    return frame
+
+
+def _encode_request(frame, media_type):
+    if media_type == ARROW:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    columns = {c: frame[c].tolist() for c in frame.columns}
+    if media_type == MSGPACK:
+        return msgpack.packb(columns)
+    return orjson.dumps(columns) if orjson is not None else json.dumps(columns).encode("utf-8")
+
+
+def _cpu(fn, repeat):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.process_time()
+        result = fn()
+        best = min(best, time.process_time() - start)
+    return best, result
+
+
+def benchmark(rows=100_000, repeat=3, pipeline=None):
+    """
+    Server-side CPU seconds per 100k rows to decode a request and encode the
+    response, per format, plus wire sizes. Scoring itself is the same for
+    every format and reported once.
+    """
+    from src.mlproject.features import encode_profile
+
+    frame = _label_frame(rows)
+    risk = np.random.default_rng(0).random(rows)
+    scale = 100_000 / rows
+    report = {}
+
+    # baseline: a JSON list of objects validated one by one, as /predict does per request
+    try:
+        from pydantic import BaseModel
+
+        class Profile(BaseModel):
+            age: int
+            sex: str
+            cp: str
+            trestbps: int
+            chol: int
+            fbs: str
+            restecg: str
+            thalach: int
+            exang: str
+            oldpeak: float
+            slope: str
+            ca: int
+            thal: str
+
+        records = json.dumps(frame.to_dict(orient="records")).encode("utf-8")
+
+        def per_object():
+            profiles = [Profile(**r) for r in json.loads(records)]
+            return pd.DataFrame([encode_profile(p.model_dump()) for p in profiles], columns=FEATURE_COLUMNS)
+
+        decode_s, _ = _cpu(per_object, 1)
+        encode_s, body = _cpu(lambda: json.dumps([{"risk": r, "prediction": int(r > 0.5)} for r in risk.tolist()]).encode(), 1)
+        report["json (pydantic objects)"] = {
+            "decode_ms": round(1000 * decode_s * scale, 1), "encode_ms": round(1000 * encode_s * scale, 1),
+            "request_bytes": len(records), "response_bytes": len(body),
+        }
+    except Exception:
+        pass
+
+    for media_type in available_formats():
+        request = _encode_request(frame, media_type)
+        decode_s, decoded = _cpu(lambda: decode_batch(request, media_type), repeat)
+        encode_s, body = _cpu(lambda: encode_result(risk, media_type), repeat)
+        entry = {
+            "decode_ms": round(1000 * decode_s * scale, 1), "encode_ms": round(1000 * encode_s * scale, 1),
+            "request_bytes": len(request), "response_bytes": len(body),
+        }
+        for encoding in ("gzip", "zstd"):
+            compress_s, (compressed, used) = _cpu(lambda: compress(body, encoding), repeat)
+            if used:
+                entry[f"{encoding}_ms"] = round(1000 * compress_s * scale, 1)
+                entry[f"{encoding}_bytes"] = len(compressed)
+        report[media_type] = entry
+
+    if pipeline is not None:
+        score_s, _ = _cpu(lambda: pipeline.predict_risk(decoded), repeat)
+        report["scoring_ms"] = round(1000 * score_s * scale, 1)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CPU cost per 100k rows of each batch wire format")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--with-model", action="store_true", help="also time scoring with the published model")
+    args = parser.parse_args()
+
+    pipeline = None
+    if args.with_model:
+        from src.mlproject.predict_pipelines import get_predict_pipeline
+        pipeline = get_predict_pipeline()
+    print(json.dumps(benchmark(args.rows, args.repeat, pipeline), indent=2))
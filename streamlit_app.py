@@ -1,8 +1,15 @@
+import os
+import sys
+
 import streamlit as st
 import requests
 
-# ------------------------- Backend URL -------------------------
+# the pooled, cached backend client lives with the deployable frontend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend-deploy"))
+import api_client as api
+
 API_URL = "https://heart4-d439a3d5247d.herokuapp.com/"   # Change if deployed
+api.set_base_url(API_URL)
 
 st.set_page_config(page_title="🪀 Heart Risk & Diet AI", layout="wide")
 
@@ -12,10 +19,13 @@ language = st.sidebar.selectbox("🌐 Select Output Language", ["English", "Hind
 st.title("🫀 Risk Of Heart Disease Predictor & Diet Assistant")
 
 # ------------------------- Session State -------------------------
-for key in ["predicted", "prediction", "diet_plan_text", "risk_report", "lifestyle", "doctor_note", "chat_history"]:
+for key in ["predicted", "prediction", "diet_plan_text", "risk_report", "lifestyle", "doctor_note", "chat_history", "chat_session_id"]:
     if key not in st.session_state:
         st.session_state[key] = False if key == "predicted" else [] if key == "chat_history" else None
 
+# report section -> session state key holding its text
+SECTION_STATE = {"diet_plan": "diet_plan_text", "risk_report": "risk_report", "lifestyle": "lifestyle", "doctor_note": "doctor_note"}
+
 # ------------------------- Tabs -------------------------
 profile_tab, diet_tab, report_tab, lifestyle_tab, doctor_tab = st.tabs(
     ["📋 Profile", "🥗 Diet Plan", "🗾 Risk Report", "🏃 Lifestyle", "📄 Doctor's Note"]
@@ -61,12 +71,10 @@ with profile_tab:
     }
 
     if st.button("🚑 Predict Risk"):
-        res = requests.post(f"{API_URL}/predict", json=profile)
-        if res.status_code == 200:
-            data = res.json()
-            st.session_state["prediction"] = data["prediction"]
+        try:
+            st.session_state["prediction"] = api.predict(profile)
             st.session_state["predicted"] = True
-        else:
+        except requests.RequestException:
             st.error("❌ Prediction failed.")
 
     if st.session_state["predicted"]:
@@ -76,14 +84,22 @@ with profile_tab:
         else:
             st.success("✅ **Low Risk of Heart Disease. Keep maintaining your health!**")
 
+        if st.button("📑 Generate All Sections"):
+            # the four sections are requested in parallel
+            with st.spinner("Preparing diet plan, risk report, lifestyle advice and doctor's note..."):
+                results, errors = api.fetch_sections(profile, st.session_state["prediction"], language)
+            for name, text in results.items():
+                st.session_state[SECTION_STATE[name]] = text
+            if errors:
+                st.error(f"❌ Could not generate: {', '.join(errors)}")
+
 # ------------------------- Diet Plan Tab -------------------------
 with diet_tab:
     if st.session_state["predicted"]:
         if st.button("🥗 Generate Diet Plan"):
-            res = requests.post(f"{API_URL}/diet-plan", json=profile)
-            if res.status_code == 200:
-                st.session_state["diet_plan_text"] = res.json()["diet_plan"]
-            else:
+            try:
+                st.session_state["diet_plan_text"] = api.section("diet_plan", profile, st.session_state["prediction"])
+            except requests.RequestException:
                 st.error("❌ Diet plan generation failed.")
 
         if st.session_state["diet_plan_text"]:
@@ -98,9 +114,10 @@ with diet_tab:
 with report_tab:
     if st.session_state["predicted"]:
         if st.button("🗾 Generate Risk Report"):
-            res = requests.post(f"{API_URL}/risk-report", params={"prediction": st.session_state["prediction"], "language": language}, json=profile)
-            if res.status_code == 200:
-                st.session_state["risk_report"] = res.json()["risk_report"]
+            try:
+                st.session_state["risk_report"] = api.section("risk_report", profile, st.session_state["prediction"], language)
+            except requests.RequestException:
+                st.error("❌ Risk report generation failed.")
 
         if st.session_state.get("risk_report"):
             st.markdown("### 🗾 Risk Report")
@@ -114,9 +131,10 @@ with report_tab:
 with lifestyle_tab:
     if st.session_state["predicted"]:
         if st.button("🏃 Lifestyle Suggestions"):
-            res = requests.post(f"{API_URL}/lifestyle", params={"language": language}, json=profile)
-            if res.status_code == 200:
-                st.session_state["lifestyle"] = res.json()["lifestyle"]
+            try:
+                st.session_state["lifestyle"] = api.section("lifestyle", profile, st.session_state["prediction"], language)
+            except requests.RequestException:
+                st.error("❌ Lifestyle suggestions failed.")
 
         if st.session_state.get("lifestyle"):
             st.markdown("### 🏃 Lifestyle Advice")
@@ -129,9 +147,10 @@ with lifestyle_tab:
 with doctor_tab:
     if st.session_state["predicted"]:
         if st.button("📄 Generate Doctor's Note"):
-            res = requests.post(f"{API_URL}/doctor-note", params={"prediction": st.session_state["prediction"], "language": language}, json=profile)
-            if res.status_code == 200:
-                st.session_state["doctor_note"] = res.json()["doctor_note"]
+            try:
+                st.session_state["doctor_note"] = api.section("doctor_note", profile, st.session_state["prediction"], language)
+            except requests.RequestException:
+                st.error("❌ Doctor's note generation failed.")
 
         if st.session_state.get("doctor_note"):
             st.markdown("### 📄 Doctor's Note")
@@ -146,11 +165,16 @@ with st.sidebar:
     user_input = st.chat_input("❓ Ask anything")
 
     if user_input:
-        res = requests.post(f"{API_URL}/chat", json={"message": user_input, "language": language})
-        if res.status_code == 200:
-            reply = res.json()["reply"]
+        payload = {"message": user_input, "language": language, "session_id": st.session_state["chat_session_id"]}
+        if st.session_state["predicted"]:
+            payload.update(profile=profile, prediction=st.session_state["prediction"])
+        try:
+            data = api.chat(payload)
+            st.session_state["chat_session_id"] = data.get("session_id")
             st.session_state.chat_history.append({"role": "user", "content": user_input})
-            st.session_state.chat_history.append({"role": "assistant", "content": reply})
+            st.session_state.chat_history.append({"role": "assistant", "content": data["reply"]})
+        except requests.RequestException:
+            st.error("❌ Chat request failed.")
 
     for msg in st.session_state.chat_history[::-1]:
         with st.chat_message(msg["role"]):
@@ -0,0 +1,43 @@
+import os
+
+from src.mlproject import artifact_store
+from src.mlproject.artifact_store import ArtifactStore, ArtifactStoreConfig
+
+
+def _store(tmp_path, **overrides):
+    return ArtifactStore(ArtifactStoreConfig(root_dir=str(tmp_path / "artifacts"), **overrides))
+
+
+def test_file_mode_follows_the_umask(tmp_path):
+    umask = artifact_store._current_umask()
+    path = tmp_path / "plain"
+    path.write_bytes(b"")
+    assert os.stat(path).st_mode & 0o777 == 0o666 & ~umask
+    assert artifact_store.FILE_MODE == 0o666 & ~umask
+
+
+def test_old_runs_and_their_objects_are_pruned(tmp_path):
+    store = _store(tmp_path, keep_runs=2, prune_grace_seconds=0)
+    first = store.commit_run({"preprocessor": "shared", "model": "model 1"})
+    second = store.commit_run({"preprocessor": "shared", "model": "model 2"})
+    third = store.commit_run({"preprocessor": "shared", "model": "model 3"})
+
+    assert store.load_manifest(first["run_id"]) is None
+    assert store.load_manifest(second["run_id"]) is not None
+    assert not os.path.exists(first["artifacts"]["model"]["path"])
+    assert os.path.exists(third["artifacts"]["preprocessor"]["path"])
+    assert sorted(os.listdir(store.objects_dir)) == sorted(
+        os.path.basename(run["artifacts"][name]["path"])
+        for run, name in [(second, "model"), (third, "model"), (third, "preprocessor")]
+    )
+    _, objects = store.load_run()
+    assert objects == {"preprocessor": "shared", "model": "model 3"}
+
+
+def test_recent_unreferenced_objects_are_kept(tmp_path):
+    store = _store(tmp_path, keep_runs=1)
+    store.commit_run({"model": "model 1"})
+    # e.g. put() by a commit that has not written its manifest yet
+    pending = store.put("pending")
+    store.commit_run({"model": "model 2"})
+    assert os.path.exists(pending["path"])
@@ -0,0 +1,82 @@
+import multiprocessing
+import threading
+
+from src.mlproject.chat_memory import ChatMemoryConfig, ConversationStore
+
+
+def _config(tmp_path, **overrides):
+    return ChatMemoryConfig(chat_dir=str(tmp_path / "chat"), **overrides)
+
+
+def _worker_turns(chat_dir, session_id, worker, turns):
+    # a separate process, like another gunicorn worker
+    store = ConversationStore(ChatMemoryConfig(chat_dir=chat_dir, history_token_budget=10**6))
+    for turn in range(turns):
+        _, conversation = store.get(session_id)
+        store.record(conversation, f"question {worker}-{turn}", f"answer {worker}-{turn}")
+
+
+def test_unknown_session_id_gets_a_fresh_id(tmp_path):
+    store = ConversationStore(_config(tmp_path))
+    session_id, conversation = store.get("chosen-by-client")
+    assert session_id != "chosen-by-client"
+    assert conversation.session_id == session_id
+    assert store.get(session_id)[0] == session_id
+
+
+def test_sessions_are_shared_across_workers(tmp_path):
+    first = ConversationStore(_config(tmp_path))
+    session_id, conversation = first.get(profile={"age": 50}, prediction=1)
+    first.record(conversation, "hi", "hello")
+
+    # a second store on the same database, as in another worker
+    second = ConversationStore(_config(tmp_path))
+    same_id, conversation = second.get(session_id)
+    assert same_id == session_id
+    assert list(conversation.turns) == [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "hello"},
+    ]
+    assert conversation.profile == {"age": 50} and conversation.prediction == 1
+
+
+def test_concurrent_turns_from_several_processes_are_all_kept(tmp_path):
+    store = ConversationStore(_config(tmp_path))
+    session_id, _ = store.get()
+
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_worker_turns, args=(str(tmp_path / "chat"), session_id, w, 10))
+        for w in range(3)
+    ]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+        assert process.exitcode == 0
+
+    turns = list(store.get(session_id)[1].turns)
+    assert len(turns) == 60
+    assert {t["content"] for t in turns if t["role"] == "user"} == {
+        f"question {w}-{t}" for w in range(3) for t in range(10)
+    }
+
+
+def test_background_summary_only_replaces_its_own_version(tmp_path):
+    release = threading.Event()
+
+    def summarizer(previous, evicted):
+        release.wait(10)
+        return f"summary of {evicted[0]['content'][0]}"
+
+    store = ConversationStore(_config(tmp_path, history_token_budget=20), summarizer=summarizer)
+    session_id, conversation = store.get()
+    store.record(conversation, "x" * 60, "y" * 60)
+    # folded synchronously, before the summarizer returns
+    assert store.get(session_id)[1].summary.startswith("user: xxx")
+
+    # a second fold while the first summary is still running: the first must not win
+    store.record(conversation, "z" * 60, "w" * 60)
+    release.set()
+    store._executor.shutdown(wait=True)
+    assert store.get(session_id)[1].summary == "summary of z"
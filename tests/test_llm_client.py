@@ -0,0 +1,53 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.mlproject.llm_client import FakeUpstream, LLMClient, LLMClientConfig, RateLimiter, SLOConfig
+
+
+def _client(upstream_threads=2, latency=1.0):
+    upstream = FakeUpstream(latency=latency, jitter=0.0)
+    config = LLMClientConfig(global_rate=1000, global_burst=1000, client_rate=1000, client_burst=1000)
+    slo = SLOConfig(enabled=True, default_budget=0.3, budgets={}, upstream_threads=upstream_threads, hedge_min_delay=10)
+    return LLMClient(upstream, config, slo)
+
+
+def test_abandoned_calls_are_not_sent_upstream():
+    llm = _client()
+
+    def one(i):
+        return llm.complete_within("e", [{"role": "user", "content": f"p{i}"}], fallback=lambda: "t", client_id=f"c{i}")
+
+    with ThreadPoolExecutor(20) as pool:
+        results = list(pool.map(one, range(20)))
+    llm._get_pool().shutdown(wait=True)
+
+    assert all(fell_back for _, fell_back in results)
+    # only the calls already running when their waiters gave up reached the upstream
+    assert llm.stats["upstream_calls"] == 2
+    assert llm.stats["cancelled"] == 18
+    assert llm._hedged_calls == {}
+
+
+def test_call_is_kept_while_a_coalesced_waiter_remains():
+    llm = _client(upstream_threads=1, latency=0.5)
+    messages = [{"role": "user", "content": "same prompt"}]
+    results = {}
+
+    def patient():
+        results["patient"] = llm.complete_within("e", messages, fallback=lambda: "t", client_id="a", budget=5)
+
+    thread = threading.Thread(target=patient)
+    thread.start()
+    # joins the same call, then gives up long before the answer arrives
+    assert llm.complete_within("e", messages, fallback=lambda: "t", client_id="b", budget=0.1) == ("t", True)
+    thread.join(10)
+
+    text, fell_back = results["patient"]
+    assert (text, fell_back) == ("echo: same prompt", False)
+    assert llm.stats["upstream_calls"] == 1 and llm.stats["cancelled"] == 0
+
+
+def test_global_limit_is_split_between_worker_processes():
+    config = LLMClientConfig(global_rate=6, global_burst=10, processes=3)
+    bucket = RateLimiter(config).global_bucket
+    assert bucket.rate == 2 and bucket.capacity == 10 / 3
@@ -0,0 +1,78 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import joblib
+import pandas as pd
+
+from src.mlproject.components.sql_ingestion import SqlIngestion, SqlIngestionConfig
+from src.mlproject.features import FEATURE_COLUMNS
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+DATA_PATH = REPO_ROOT / "notebook" / "data" / "cleaned_data.csv"
+
+
+def _write_table(db_path, start_id=1):
+    df = pd.read_csv(DATA_PATH)
+    df.insert(0, "id", range(start_id, start_id + len(df)))
+    with sqlite3.connect(db_path) as connection:
+        df.to_sql("heart", connection, index=False, if_exists="append")
+    return df
+
+
+def test_iter_parts_drops_the_watermark_column(tmp_path):
+    db_path = tmp_path / "heart.db"
+    _write_table(db_path)
+    config = SqlIngestionConfig(
+        watermark_column="id",
+        chunksize=300,
+        parts_dir=str(tmp_path / "sql_parts"),
+        state_file_path=str(tmp_path / "state.json"),
+        sqlite_path=str(db_path),
+    )
+    ingestion = SqlIngestion(config)
+    ingestion.pull()
+
+    columns = FEATURE_COLUMNS + ["target"]
+    chunks = list(ingestion.iter_parts(columns=columns))
+    assert all(list(chunk.columns) == columns for chunk in chunks)
+    assert max(len(chunk) for chunk in chunks) <= 300
+    assert sum(len(chunk) for chunk in chunks) == len(pd.read_csv(DATA_PATH))
+
+
+def test_streaming_training_from_sql_with_watermark(tmp_path):
+    db_path = tmp_path / "heart.db"
+    rows = len(_write_table(db_path))
+    env = dict(
+        os.environ,
+        DATA_SOURCE="sql",
+        SQLITE_PATH=str(db_path),
+        SQL_WATERMARK_COLUMN="id",
+        STREAMING_EPOCHS="1",
+    )
+    env.pop("ARTIFACT_STORE_DIR", None)
+    result = subprocess.run(
+        [sys.executable, str(REPO_ROOT / "main.py"), "--streaming"],
+        cwd=tmp_path, env=env, capture_output=True, text=True, timeout=600,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    for split in ("train.csv", "test.csv"):
+        assert list(pd.read_csv(tmp_path / "artifact" / split, nrows=1).columns) == FEATURE_COLUMNS + ["target"]
+
+    with open(tmp_path / "artifacts" / "manifest.json") as f:
+        manifest = json.load(f)
+    assert manifest["metadata"]["training_mode"] == "streaming"
+    assert {"preprocessor", "model", "similarity_index"} <= set(manifest["artifacts"])
+
+    preprocessor = joblib.load(tmp_path / manifest["artifacts"]["preprocessor"]["path"])
+    assert preprocessor.columns == FEATURE_COLUMNS
+    model = joblib.load(tmp_path / manifest["artifacts"]["model"]["path"])
+    sample = pd.read_csv(DATA_PATH, nrows=5)[FEATURE_COLUMNS]
+    assert len(model.predict(preprocessor.transform(sample))) == 5
+
+    with open(tmp_path / "artifact" / "sql_ingestion_state.json") as f:
+        assert json.load(f)["watermark"] == rows
@@ -0,0 +1,52 @@
+import json
+from pathlib import Path
+
+import joblib
+import pandas as pd
+import pytest
+
+import main
+from src.mlproject.components.similarity_index import SimilarityIndexBuilder
+from src.mlproject.components.streaming_trainer import StreamingTrainerConfig
+from src.mlproject.features import FEATURE_COLUMNS
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+DATA_PATH = REPO_ROOT / "notebook" / "data" / "cleaned_data.csv"
+
+
+@pytest.fixture
+def source_with_extra_column(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(StreamingTrainerConfig, "epochs", 1)
+    df = pd.read_csv(DATA_PATH)
+    df.insert(0, "patient_id", range(len(df)))
+    path = tmp_path / "source.csv"
+    df.to_csv(path, index=False)
+    return path
+
+
+def _manifest(tmp_path):
+    with open(tmp_path / "artifacts" / "manifest.json") as f:
+        return json.load(f)
+
+
+def test_extra_source_columns_are_not_features(tmp_path, source_with_extra_column):
+    main.run_streaming_training(str(source_with_extra_column))
+
+    manifest = _manifest(tmp_path)
+    assert {"preprocessor", "model", "similarity_index"} <= set(manifest["artifacts"])
+    preprocessor = joblib.load(manifest["artifacts"]["preprocessor"]["path"])
+    assert preprocessor.columns == FEATURE_COLUMNS
+
+
+def test_failed_stage_does_not_publish(tmp_path, source_with_extra_column, monkeypatch):
+    main.run_streaming_training(str(source_with_extra_column))
+    published = _manifest(tmp_path)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("similarity index failed")
+
+    monkeypatch.setattr(SimilarityIndexBuilder, "initiate_similarity_index", fail)
+    with pytest.raises(RuntimeError):
+        main.run_streaming_training(str(source_with_extra_column))
+    assert _manifest(tmp_path)["run_id"] == published["run_id"]